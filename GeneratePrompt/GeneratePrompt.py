@@ -1,18 +1,27 @@
 # -*- coding: utf-8 -*-
 import os
+import sys
 import json
 from openai import OpenAI
 
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from utils.telemetry import Telemetry, tracked_completion
+from utils.retry import RetryPolicy, get_circuit_breaker
+from utils.client_pool import load_client_pool
+
 class DynamicCodeGenerator:
-    def __init__(self, api_key):
-        self.client = self._init_client(api_key)
+    def __init__(self, api_key, telemetry=None, client=None):
+        self.client = client or self._init_client(api_key)  # client 可传入 utils.client_pool.ClientPool
         self.model = "deepseek/deepseek-chat"
+        self.telemetry = telemetry  # 可选：Telemetry 实例（逐次调用记录）
+        self.retry_policy = RetryPolicy(max_attempts=3, breaker=get_circuit_breaker(str(self.client.base_url)))
         
     def _init_client(self, api_key):
             
         return OpenAI(
             api_key=api_key,
             base_url="https://openrouter.ai/api/v1",
+            max_retries=0,  # 重试统一由 retry_policy 负责
         )
         
     def generate_code(self, requirement):
@@ -59,14 +68,18 @@ class DynamicCodeGenerator:
         """
             
         try:
-            response = self.client.chat.completions.create(
-                model=self.model,
-                messages=[
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": requirement}
-                ],
-                temperature=0.1,
-                max_tokens=5000
+            response = self.retry_policy.call(
+                lambda attempt: tracked_completion(
+                    self.client, self.telemetry, "codegen", attempt=attempt,
+                    model=self.model,
+                    messages=[
+                        {"role": "system", "content": system_prompt},
+                        {"role": "user", "content": requirement}
+                    ],
+                    temperature=0.1,
+                    max_tokens=5000
+                ),
+                label="codegen"
             )
             return self._clean_output(response.choices[0].message.content)
             
@@ -89,7 +102,9 @@ class DynamicCodeGenerator:
 def main():
     config = {
         "api_key": "------------------------------------------------------------",
-        "output_file": "generated_code.txt"
+        "output_file": "generated_code.txt",
+        "telemetry_path": "telemetry/calls.jsonl",
+        "endpoints_path": None  # 多密钥/多端点配置（JSON，见 utils/client_pool.py）
     }
     
     try:
@@ -99,7 +114,8 @@ def main():
             raise ValueError("输入不能为空")
             
         # 生成代码
-        generator = DynamicCodeGenerator(config["api_key"])
+        client = load_client_pool(config["endpoints_path"]) if config["endpoints_path"] else None
+        generator = DynamicCodeGenerator(config["api_key"], Telemetry(config["telemetry_path"]), client)
         generated = generator.generate_code(user_input)
         
         # 保存结果
@@ -11,14 +11,17 @@ Created on Fri Feb  7 22:46:18 2025
 @author: JINGHANG
 """
 
-import fitz
 import pandas as pd
 import time
 import os
-import json
+import sys
 from openai import OpenAI
 import glob
 
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from utils.pdf_text import TextCache, load_pages
+from utils.json_repair import coerce_record, loads_tolerant
+
 class AdvancedCatalysisParser:
     def __init__(self, api_key):
         self.client = OpenAI(
@@ -94,12 +97,9 @@ class AdvancedCatalysisParser:
     
     def extract_text(self, pdf_path):
         """优化文本提取逻辑"""
-        full_text = ""
         try:
-            doc = fitz.open(pdf_path)
-            for page in doc:
-                text = page.get_text()
-                full_text += text.replace('\n', ' ') + "\n"
+            pages = load_pages(pdf_path, self.text_cache)
+            full_text = "".join(text.replace('\n', ' ') + "\n" for text in pages)
             print(f"提取到有效文本段落: {len(full_text.split('.'))} 个")
             return full_text
         except Exception as e:
@@ -107,43 +107,14 @@ class AdvancedCatalysisParser:
             return ""
     
     def parse_response(self, response):
-        """增强版JSON解析器"""
+        """容错JSON解析：修复代码块/前言/弯引号/尾随逗号/截断后，按 required_columns 校验"""
         try:
-            cleaned = response.strip()
-            
-            # 改进Markdown代码块处理
-            if cleaned.startswith('```json'):
-                cleaned = cleaned[7:-3].strip()  # 正确去除前后标记
-            elif cleaned.startswith('```'):
-                cleaned = cleaned[3:-3].strip()
-            
-            # 增强字符过滤
-            cleaned = (
-                cleaned.replace('“', '"')
-                       .replace('”', '"')
-                       .replace("'", '"')  # 处理单引号
-                       #.replace("\\n", "")  # 去除转义字符
-                       #.replace('"', '"')  # 转义双引号
-
-            )
-            
-            # 新增空内容检查
-            if not cleaned:
-                raise ValueError("Empty JSON content")
-                
-            # 验证并解析
-            data = json.loads(cleaned)
-            
-            # 字段类型校验
-            return pd.DataFrame([{
-                col: data.get(col, None) for col in self.required_columns  # 使用None保持null
-            }])
-            
-        except json.JSONDecodeError as e:
-            print(f"JSON解析失败 | 清理后内容:\n{cleaned}\n错误详情: {str(e)}")  # 显示清理后的内容
-            return pd.DataFrame()
-        except Exception as e:
-            print(f"预处理错误: {str(e)}")
+            record, missing = coerce_record(loads_tolerant(response), self.required_columns)
+            if missing:
+                print(f"响应缺少字段（记为null）: {', '.join(missing)}")
+            return pd.DataFrame([record], columns=self.required_columns)
+        except ValueError as e:
+            print(f"JSON解析失败 | 原始内容:\n{(response or '')[:500]}\n错误详情: {str(e)}")
             return pd.DataFrame()
 
     def process_pdf(self, pdf_path):
@@ -223,6 +194,7 @@ class SerialCatalysisParser(AdvancedCatalysisParser):
     def __init__(self, api_key):
         super().__init__(api_key)
         self.header_written = False  # 新增状态跟踪
+        self.text_cache = None  # 可选：TextCache 实例（放在此处，以免被生成的 __init__ 覆盖）
         
     def process_files(self, pdf_files, output_path):
         """顺序处理所有文件"""
@@ -293,6 +265,8 @@ def main(config):
     
     # 初始化解析器
     parser = SerialCatalysisParser(config["api_key"])
+    if config.get("text_cache_dir"):
+        parser.text_cache = TextCache(config["text_cache_dir"])  # 不同需求模板共用同一份文本缓存
     
     # 处理文件
     success_count = parser.process_files(pdf_files, output_path)
@@ -307,6 +281,7 @@ if __name__ == "__main__":
     config = {
         "api_key": "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",
         "input_folder": "./pdf_files",
-        "output_csv": "results_RShi.csv"
+        "output_csv": "results_RShi.csv",
+        "text_cache_dir": "../ProcessPDF/cache/text"  # PDF逐页文本缓存（留空则不缓存）
     }
     main(config)
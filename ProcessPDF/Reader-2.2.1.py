@@ -11,21 +11,71 @@ Created on Fri Feb  7 22:46:18 2025
 @author: JINGHANG
 """
 
-import fitz
 import pandas as pd
 import time
 import os
-import json
+import sys
+import re
+import argparse
+import asyncio
+import threading
+from types import SimpleNamespace
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 from openai import OpenAI
 import glob
 
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from utils.rate_limit import get_rate_limiter
+from utils.response_cache import ResponseCache
+from utils.pdf_text import TextCache, load_pages, pages_to_text, clean_text, describe_cleanup, extract_text_worker
+from utils.chunking import CHARS_PER_TOKEN, build_queries, select_relevant_text, pack_windows
+from utils.records import is_null_value, merge_list_values, split_list_value
+from utils.quantities import parse_quantities
+from utils.telemetry import Telemetry, tracked_completion, tracked_stream_completion
+from utils.json_stream import read_json_stream
+from utils.retry import RetryPolicy, RetryableOutputError, classify_error, get_circuit_breaker
+from utils.json_repair import coerce_record, loads_tolerant
+from utils.run_manifest import RunManifest, STATUS_SUCCESS, STATUS_FAILED
+from utils.consensus import ConsensusEngine
+from utils.client_pool import load_client_pool
+
 class AdvancedCatalysisParser:
-    def __init__(self, api_key):
-        self.client = OpenAI(
+    def __init__(self, api_key, client=None):
+        # client 可传入 utils.client_pool.ClientPool（多密钥/多端点）
+        self.client = client or OpenAI(
             api_key=api_key,
             base_url="https://openrouter.ai/api/v1",
+            max_retries=0,  # 重试统一由 retry_policy 负责
         )
         self.model_name = "deepseek/deepseek-r1"
+        self.temperature = 0.05
+        self.response_cache = None  # 可选：ResponseCache 实例
+        self.text_cache = None  # 可选：TextCache 实例
+        self.strip_boilerplate = False  # 去除页眉页脚/行号并截去参考文献
+        self.manifest = None  # 可选：RunManifest 实例（断点续跑）
+        self.telemetry = None  # 可选：Telemetry 实例（逐次调用记录）
+        self.context_selection = "truncate"  # truncate：截取前60000字符；rank：按字段相关性挑选片段
+        self.max_context_tokens = 15000
+        self._field_queries = None
+        self.map_workers = 4  # map_reduce 模式下单篇文献的并行窗口数
+        self.stream_responses = False  # 流式读取响应，JSON对象闭合后只读末尾 usage，格式异常时提前中止重试
+        self.max_preamble_chars = 2000  # 流式模式下JSON对象之前允许的最长前言
+        self.json_mode = False  # 请求 response_format=json_object（服务商拒绝该参数时该请求改为普通模式重试）
+        # 重试：Retry-After 优先，否则去相关抖动退避；同一端点共享熔断器
+        self.retry_policy = RetryPolicy(breaker=get_circuit_breaker(str(self.client.base_url)))
+        # 列表型字段：分窗合并时取并集，其余字段取首个非空值
+        self.list_fields = {
+            "co_elements", "pollutants", "pollutant_constant", "pilot_pollutant",
+            "ORS", "EPR_signals", "quencher"
+        }
+        # 级联模式：先用快速模型抽取，本地校验不通过的字段再由 model_name（推理模型）重抽
+        self.cascade_model = None
+        self.cascade_required_fields = {"catalyst", "SA_element", "oxidant", "pollutants", "DOI"}
+        self.cascade_grounded_fields = {"catalyst", "SA_element", "oxidant", "DOI"}  # 取值须能在原文中找到
+        self.cascade_quantity_fields = {"dose_catalyst", "dose_oxidant", "pH", "pollutant_constant"}
+        self.cascade_stats = {"papers": 0, "escalated": 0, "fields": 0}
+        self._cascade_lock = threading.Lock()
         self.required_columns = [
             "catalyst", "catalyst_substrate", "SA_element", "SA_valence", "co_elements", 
             "oxidant", "pollutants", "pollutant_constant", "dose_catalyst", "dose_oxidant", 
@@ -89,12 +139,13 @@ class AdvancedCatalysisParser:
 
     
     def extract_text(self, pdf_path):
-        full_text = ""
         try:
-            doc = fitz.open(pdf_path)
-            for page in doc:
-                text = page.get_text()
-                full_text += text.replace('\n', ' ') + "\n"
+            pages = load_pages(pdf_path, self.text_cache)
+            if self.strip_boilerplate:
+                full_text, stats = clean_text(pages)
+                print(describe_cleanup(stats))
+            else:
+                full_text = pages_to_text(pages)
             print(f"提取到有效文本段落: {len(full_text.split('.'))} 个")
             return full_text
         except Exception as e:
@@ -102,112 +153,251 @@ class AdvancedCatalysisParser:
             return ""
     
     def parse_response(self, response):
-        """增强版JSON解析器"""
+        """容错JSON解析：修复代码块/前言/弯引号/尾随逗号/截断后，按 required_columns 校验"""
         try:
-            cleaned = response.strip()
-            
-            if cleaned.startswith('```json'):
-                cleaned = cleaned[7:-3].strip()
-            elif cleaned.startswith('```'):
-                cleaned = cleaned[3:-3].strip()
-            
-            cleaned = (
-                cleaned.replace('“', '"')
-                       .replace('”', '"')
-                       .replace("'", '"') 
-                       #.replace("\\n", "") 
-                       #.replace('"', '"') 
-
-            )
-            
-            if not cleaned:
-                raise ValueError("Empty JSON content")
-                
-            data = json.loads(cleaned)
-            
-            return pd.DataFrame([{
-                col: data.get(col, None) for col in self.required_columns 
-            }])
-            
-        except json.JSONDecodeError as e:
-            print(f"JSON解析失败 | 清理后内容:\n{cleaned}\n错误详情: {str(e)}") 
-            return pd.DataFrame()
-        except Exception as e:
-            print(f"预处理错误: {str(e)}")
+            record, missing = coerce_record(loads_tolerant(response), self.required_columns)
+            if missing:
+                print(f"响应缺少字段（记为null）: {', '.join(missing)}")
+            return pd.DataFrame([record], columns=self.required_columns)
+        except ValueError as e:
+            print(f"JSON解析失败 | 原始内容:\n{(response or '')[:500]}\n错误详情: {str(e)}")
             return pd.DataFrame()
 
     def process_pdf(self, pdf_path):
         """优化后的PDF处理函数（含完整错误处理）"""
-        text = self.extract_text(pdf_path)
+        return self.process_text(pdf_path, self.extract_text(pdf_path))
+
+    def select_context(self, text):
+        """选择送入模型的正文（map_reduce 模式不经过此处，按窗口切分全文）"""
+        if self.context_selection != "rank":
+            return text[:60000]
+        if self._field_queries is None:
+            # 以提示词中各字段的说明作为检索查询
+            self._field_queries = build_queries(self.generate_prompt(""), self.required_columns)
+        selected = select_relevant_text(text, self._field_queries, self.max_context_tokens)
+        print(f"相关片段筛选: {len(text)} → {len(selected)} 字符")
+        return selected
+
+    def process_text(self, pdf_path, text, model_name=None):
+        """对已提取的文本调用模型并解析（model_name 默认为 self.model_name）"""
         if not text:
             print(f"警告: {pdf_path} 无有效文本")
             return pd.DataFrame()
-    
-        # 配置参数
-        max_retries = 3
-        base_delay = 30
-        timeout = 300
-        parsed_data = pd.DataFrame()
-    
-        for attempt in range(max_retries + 1):
-            try:
-                response = self.client.chat.completions.create(
-                    model=self.model_name,
-                    messages=[{
-                        "role": "user",
-                        "content": self.generate_prompt(text[:60000])  # 限制输入长度
-                    }],
-                    temperature=0.05,
-                    timeout=timeout  # 新增超时参数
-                )
-    
-                if not response.choices:
-                    raise ValueError("空API响应")
-                
-                content = response.choices[0].message.content
-                if not content:
-                    raise ValueError("无有效响应内容")
-    
-                parsed_data = self.parse_response(content)
+
+        if model_name is None and self.cascade_model:
+            return self.process_cascade(pdf_path, text)
+        if self.context_selection == "map_reduce":
+            return self.process_map_reduce(pdf_path, text, model_name)
+        return self.request_extraction(pdf_path, self.generate_prompt(self.select_context(text)), model_name)
+
+    def process_cascade(self, pdf_path, text):
+        """先用快速模型抽取；必填字段为空、取值不见于原文或格式非法时，再请求推理模型并替换这些字段"""
+        df = self.process_text(pdf_path, text, self.cascade_model)
+        record = df.to_dict(orient='records')[0] if not df.empty else None
+        failed = self.check_record(record, text) if record is not None else list(self.required_columns)
+
+        with self._cascade_lock:
+            self.cascade_stats["papers"] += 1
+            if failed:
+                self.cascade_stats["escalated"] += 1
+                self.cascade_stats["fields"] += len(failed)
+        if not failed:
+            return df
+
+        print(f"级联升级: {os.path.basename(pdf_path)} | 未通过校验: {', '.join(failed)}")
+        escalated = self.process_text(pdf_path, text, self.model_name)
+        if escalated.empty:
+            return df
+        if record is None:
+            return escalated
+        fallback = escalated.to_dict(orient='records')[0]
+        for col in failed:
+            if not is_null_value(fallback.get(col)):
+                record[col] = fallback[col]
+        return pd.DataFrame([record], columns=self.required_columns)
+
+    def check_record(self, record, text):
+        """本地校验抽取结果，返回未通过的字段列表"""
+        failed = []
+        source = re.sub(r'[^a-z0-9]', '', text.lower())
+        for col in self.required_columns:
+            value = record.get(col)
+            if is_null_value(value):
+                if col in self.cascade_required_fields:
+                    failed.append(col)
+                continue
+            value = str(value)
+            if col in self.cascade_grounded_fields:
+                key = re.sub(r'[^a-z0-9]', '', value.lower())
+                if key and key not in source:
+                    failed.append(col)
+                    continue
+            if col == "SA_element" and not all(
+                re.fullmatch(r'[A-Z][a-z]?', item.strip()) for item in split_list_value(value)
+            ):
+                failed.append(col)
+            elif col == "DOI" and not re.match(r'^(?:https?://(?:dx\.)?doi\.org/|doi:\s*)?10\.\d{4,9}/\S+$', value.strip(), re.IGNORECASE):
+                failed.append(col)
+            elif col in self.cascade_quantity_fields and parse_quantities(value) is None:
+                failed.append(col)
+        return failed
+
+    def process_map_reduce(self, pdf_path, text, model_name=None):
+        """超出上下文预算的长文：分窗并行抽取，再在本地按字段规则合并"""
+        window_chars = self.max_context_tokens * CHARS_PER_TOKEN
+        if len(text) <= window_chars:
+            return self.request_extraction(pdf_path, self.generate_prompt(text), model_name)
+
+        windows = pack_windows(text, window_chars)
+        print(f"分窗抽取: {os.path.basename(pdf_path)} 共 {len(windows)} 段")
+        with ThreadPoolExecutor(max_workers=min(len(windows), self.map_workers)) as executor:
+            partials = list(executor.map(
+                lambda window: self.request_extraction(pdf_path, self.generate_prompt(window), model_name),
+                windows
+            ))
+
+        records = [df.to_dict(orient='records')[0] for df in partials if not df.empty]
+        if not records:
+            print(f"无法处理 {os.path.basename(pdf_path)}")
+            return pd.DataFrame()
+        return pd.DataFrame([self.reduce_records(records)], columns=self.required_columns)
+
+    def reduce_records(self, records):
+        """确定性合并：列表型字段取并集，其余字段按窗口顺序取首个非空值"""
+        merged = {}
+        for col in self.required_columns:
+            values = [record.get(col) for record in records if not is_null_value(record.get(col))]
+            if col in self.list_fields:
+                merged[col] = merge_list_values(values)
+            else:
+                merged[col] = values[0] if values else None
+        return merged
+
+    def request_extraction(self, pdf_path, prompt, model_name=None):
+        """发送单个提示词并解析（含响应缓存与重试）"""
+        model_name = model_name or self.model_name
+        label = os.path.basename(pdf_path)
+        state = {"timeout": 300, "json_mode": self.json_mode}  # 单次请求超时(秒)，超时后逐次放宽
+
+        # 响应缓存：模型、温度、提示词均未变化时直接复用上次的原始响应
+        cache_key = None
+        if self.response_cache is not None:
+            cache_key = ResponseCache.make_key(model_name, self.temperature, prompt)
+            cached = self.response_cache.get(cache_key)
+            if cached is not None:
+                parsed_data = self.parse_response(cached["content"])
                 if not parsed_data.empty:
+                    print(f"命中响应缓存: {label}")
                     return parsed_data
-    
-            except Exception as e:
-                error_type = self.classify_error(e)
-                print(f"尝试 {attempt+1}/{max_retries} 失败 | 错误类型: {error_type}")
-    
-                if error_type == "RATE_LIMIT":
-                    delay = base_delay * (2 ** attempt)
-                    print(f"速率限制触发，等待 {delay} 秒后重试...")
-                    time.sleep(delay)
-                elif error_type == "TIMEOUT":
-                    timeout = min(timeout * 1.5, 600) 
-                    print(f"超时设置调整为 {timeout} 秒")
-                else:
-                    break
-    
-        print(f"无法处理 {os.path.basename(pdf_path)}")
-        return pd.DataFrame()
-    
-    def classify_error(self, error):
-        error_str = str(error).lower()
-        
-        if "rate limit" in error_str:
-            return "RATE_LIMIT"
-        elif "timeout" in error_str:
-            return "TIMEOUT"
-        elif "connection" in error_str:
-            return "CONNECTION_ERROR"
-        elif "invalid request" in error_str:
-            return "INVALID_REQUEST"
+
+        def attempt_once(attempt):
+            response = self.create_completion(
+                prompt, state["timeout"], attempt=attempt, item=label, model_name=model_name,
+                json_mode=state["json_mode"]
+            )
+            if not response.choices:
+                raise RetryableOutputError("空API响应")
+
+            content = response.choices[0].message.content
+            if not content:
+                raise RetryableOutputError("无有效响应内容")
+
+            if cache_key is not None:
+                self.response_cache.put(cache_key, {
+                    "content": content,
+                    "usage": self.usage_to_dict(response)
+                })
+
+            parsed_data = self.parse_response(content)
+            if parsed_data.empty:
+                raise RetryableOutputError("响应无法解析为所需JSON")
+            return parsed_data
+
+        def on_error(category, error, attempt):
+            if category == "TIMEOUT":
+                state["timeout"] = min(state["timeout"] * 1.5, 600)
+                print(f"超时设置调整为 {state['timeout']} 秒")
+            elif category == "MALFORMED_OUTPUT":
+                print(f"输出格式异常: {str(error)}")
+            elif state["json_mode"] and re.search(r'response_format|json_object', str(error)):
+                state["json_mode"] = False
+                print(f"服务商不支持 response_format，{label} 改用普通模式重试")
+                return True
+            return None
+
+        try:
+            return self.retry_policy.call(attempt_once, on_error, label=label)
+        except Exception as e:
+            print(f"无法处理 {label}: {str(e)}")
+            return pd.DataFrame()
+
+    def create_completion(self, prompt, timeout, attempt=1, item=None, model_name=None, json_mode=None):
+        """单次API调用（子类可在此挂接限流等逻辑）"""
+        if self.stream_responses:
+            return self.create_stream_completion(prompt, timeout, attempt, item, model_name, json_mode)
+        return tracked_completion(
+            self.client, self.telemetry, "reader", item=item, attempt=attempt,
+            model=model_name or self.model_name,
+            messages=[{
+                "role": "user",
+                "content": prompt
+            }],
+            temperature=self.temperature,
+            timeout=timeout,  # 新增超时参数
+            **self.format_kwargs(json_mode)
+        )
+
+    def create_stream_completion(self, prompt, timeout, attempt=1, item=None, model_name=None, json_mode=None):
+        """流式调用：读到完整JSON对象后仅等待 usage 块，返回与非流式相同结构的响应"""
+        content, usage = tracked_stream_completion(
+            self.client, self.telemetry, "reader",
+            lambda stream: read_json_stream(stream, self.max_preamble_chars),
+            item=item, attempt=attempt,
+            model=model_name or self.model_name,
+            messages=[{
+                "role": "user",
+                "content": prompt
+            }],
+            temperature=self.temperature,
+            timeout=timeout,
+            **self.format_kwargs(json_mode)
+        )
+        return SimpleNamespace(
+            choices=[SimpleNamespace(message=SimpleNamespace(content=content))],
+            usage=usage
+        )
+
+    def format_kwargs(self, json_mode=None):
+        """JSON模式下附加的请求参数；json_mode 为 None 时取解析器设置"""
+        if json_mode is None:
+            json_mode = self.json_mode
+        if json_mode:
+            return {"response_format": {"type": "json_object"}}
+        return {}
+
+    @staticmethod
+    def usage_to_dict(response):
+        """提取 response.usage 为普通字典"""
+        usage = getattr(response, "usage", None)
+        if usage is None:
+            return None
+        if hasattr(usage, "model_dump"):
+            return usage.model_dump()
+        return dict(usage)
+
+    def record_result(self, pdf_path, df):
+        """把单篇结果写入运行清单（先于CSV写入，续跑时以清单为准重建CSV）"""
+        if self.manifest is None:
+            return
+        if df.empty:
+            self.manifest.record(pdf_path, STATUS_FAILED)
         else:
-            return "UNKNOWN_ERROR"
+            self.manifest.record(pdf_path, STATUS_SUCCESS, df.to_dict(orient='records')[0])
+
+    def classify_error(self, error):
+        return classify_error(error)
 
 class SerialCatalysisParser(AdvancedCatalysisParser):
-    def __init__(self, api_key):
-        super().__init__(api_key)
-        self.header_written = False
-        
     def process_files(self, pdf_files, output_path):
         total_files = len(pdf_files)
         success_count = 0
@@ -218,7 +408,7 @@ class SerialCatalysisParser(AdvancedCatalysisParser):
                 index=False, 
                 encoding='utf-8-sig'
             )
-            self.header_written = True
+        # 表头只在新建文件时写入；续跑时文件已存在，表头已在其中
         
         for idx, pdf_path in enumerate(pdf_files, 1):
             try:
@@ -226,25 +416,230 @@ class SerialCatalysisParser(AdvancedCatalysisParser):
                 start = time.perf_counter()
                 
                 df = self.process_pdf(pdf_path)
+                self.record_result(pdf_path, df)
                 if not df.empty:
-                    df.to_csv(
-                        output_path,
-                        mode='a',
-                        header=not self.header_written,
-                        index=False,
-                        encoding='utf-8-sig'
-                    )
-                    self.header_written = True
+                    append_csv_atomic(output_path, df, header=False)
                     success_count += 1
                 
                 elapsed = time.perf_counter() - start
                 print(f"完成: {os.path.basename(pdf_path)} [耗时: {elapsed:.2f}s]")
             except Exception as e:
                 print(f"处理失败: {pdf_path} - {str(e)}")
+                self.record_result(pdf_path, pd.DataFrame())
         
         return success_count
 
 
+def append_csv_atomic(output_path, df, header=False):
+    """整块追加CSV：先在内存中序列化，再以单次 O_APPEND 写入并落盘，崩溃时不会留下半行"""
+    data = df.to_csv(index=False, header=header).encode('utf-8')
+    fd = os.open(output_path, os.O_WRONLY | os.O_APPEND | os.O_CREAT | getattr(os, 'O_BINARY', 0))
+    try:
+        os.write(fd, data)
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+def rebuild_output(output_path, columns, manifest):
+    """以运行清单中已成功的行重建输出CSV（原子替换）"""
+    tmp_path = output_path + ".tmp"
+    pd.DataFrame(manifest.succeeded_rows(), columns=columns).to_csv(
+        tmp_path,
+        index=False,
+        encoding='utf-8-sig'
+    )
+    os.replace(tmp_path, output_path)
+
+class OrderedCSVWriter:
+    """按输入顺序写出结果（乱序完成的结果先缓存，等前序结果到齐后再落盘）"""
+    def __init__(self, output_path, columns):
+        self.output_path = output_path
+        self.next_idx = 0
+        self.pending = {}
+        self.success_count = 0
+        if not os.path.exists(output_path):
+            pd.DataFrame(columns=columns).to_csv(
+                output_path,
+                index=False,
+                encoding='utf-8-sig'
+            )
+
+    def submit(self, idx, df):
+        self.pending[idx] = df
+        while self.next_idx in self.pending:
+            df = self.pending.pop(self.next_idx)
+            if not df.empty:
+                append_csv_atomic(self.output_path, df)
+                self.success_count += 1
+            self.next_idx += 1
+
+class AsyncCatalysisParser(AdvancedCatalysisParser):
+    """并发处理：多个请求同时在途，按模型共享令牌桶限流，单一有序写出"""
+    def __init__(self, api_key, max_in_flight=8, requests_per_minute=60, extract_workers=2, prefetch=None,
+                 client=None):
+        super().__init__(api_key, client)
+        self.max_in_flight = max_in_flight
+        self.extract_workers = extract_workers  # 0 表示在默认线程池中提取
+        self.prefetch = prefetch or 2 * max_in_flight  # 已提取待请求的文本数上限
+        self.requests_per_minute = requests_per_minute
+        self.rate_limiter = get_rate_limiter(self.model_name, requests_per_minute)
+
+    def create_completion(self, prompt, timeout, **kwargs):
+        if getattr(self.client, "rate_limited", False):  # 客户端池按端点限速
+            return super().create_completion(prompt, timeout, **kwargs)
+        model_name = kwargs.get("model_name") or self.model_name
+        rate_limiter = self.rate_limiter if model_name == self.model_name else get_rate_limiter(model_name, self.requests_per_minute)
+        waited = rate_limiter.acquire()
+        if waited > 1:
+            print(f"限流等待 {waited:.1f} 秒")
+        return super().create_completion(prompt, timeout, **kwargs)
+
+    def _extract_args(self, pdf_path):
+        cache_dir = self.text_cache.cache_dir if self.text_cache is not None else None
+        return extract_text_worker, pdf_path, cache_dir, self.strip_boilerplate
+
+    def _submit_extract(self, loop, pools, pdf_path):
+        """提交文本提取；进程池已被崩溃的工作进程损坏时换一个新池，提交失败则返回带异常的 future"""
+        try:
+            try:
+                return loop.run_in_executor(pools[-1], *self._extract_args(pdf_path))
+            except BrokenProcessPool:
+                pools.append(ProcessPoolExecutor(max_workers=self.extract_workers))
+                return loop.run_in_executor(pools[-1], *self._extract_args(pdf_path))
+        except Exception as e:
+            future = loop.create_future()
+            future.set_exception(e)
+            return future
+
+    async def _extract_isolated(self, pdf_path):
+        """池损坏时无法判断是哪篇PDF导致崩溃，受波及的各篇在独立进程中重试一次"""
+        loop = asyncio.get_running_loop()
+        with ProcessPoolExecutor(max_workers=1) as executor:
+            return await loop.run_in_executor(executor, *self._extract_args(pdf_path))
+
+    async def _extract_producer(self, pdf_files, queue, pools):
+        """生产者：提前提交后续PDF的文本提取，队列满时暂停以限制内存占用"""
+        loop = asyncio.get_running_loop()
+        for idx, pdf_path in enumerate(pdf_files):
+            future = self._submit_extract(loop, pools, pdf_path)
+            await queue.put((idx, pdf_path, future))
+        for _ in range(self.max_in_flight):
+            await queue.put(None)
+
+    async def _llm_consumer(self, queue, results, request_executor):
+        """消费者：取出已提取的文本并发起模型请求"""
+        loop = asyncio.get_running_loop()
+        while True:
+            item = await queue.get()
+            if item is None:
+                return
+            idx, pdf_path, future = item
+            start = time.perf_counter()
+            try:
+                try:
+                    text, cache_hit = await future
+                except BrokenProcessPool:
+                    text, cache_hit = await self._extract_isolated(pdf_path)
+            except BrokenProcessPool:
+                print(f"PDF解析异常: {os.path.basename(pdf_path)} 导致提取进程崩溃")
+                text, cache_hit = "", None
+            except Exception as e:
+                print(f"PDF解析异常: {str(e)}")
+                text, cache_hit = "", None
+            if cache_hit is not None and self.text_cache is not None:
+                # 工作进程中的缓存计数不会回传，在此按结果累加
+                if cache_hit:
+                    self.text_cache.hits += 1
+                else:
+                    self.text_cache.misses += 1
+            try:
+                df = await loop.run_in_executor(request_executor, self.process_text, pdf_path, text)
+            except Exception as e:
+                print(f"处理失败: {pdf_path} - {str(e)}")
+                df = pd.DataFrame()
+            await results.put((idx, pdf_path, df, time.perf_counter() - start))
+
+    async def process_files_async(self, pdf_files, output_path):
+        total_files = len(pdf_files)
+        writer = OrderedCSVWriter(output_path, self.required_columns)
+        queue = asyncio.Queue(maxsize=self.prefetch)
+        results = asyncio.Queue()
+
+        # 进程池负责CPU密集的PDF解析，线程池大小即在途请求上限，两者并行
+        pools = [ProcessPoolExecutor(max_workers=self.extract_workers) if self.extract_workers > 0 else None]
+        try:
+            with ThreadPoolExecutor(max_workers=self.max_in_flight) as request_executor:
+                producer = asyncio.create_task(self._extract_producer(pdf_files, queue, pools))
+                workers = [producer] + [
+                    asyncio.create_task(self._llm_consumer(queue, results, request_executor))
+                    for _ in range(self.max_in_flight)
+                ]
+                for finished in range(1, total_files + 1):
+                    idx, pdf_path, df, elapsed = await self._next_result(results, producer)
+                    self.record_result(pdf_path, df)
+                    writer.submit(idx, df)
+                    print(f"进度: {finished}/{total_files} | 完成: {os.path.basename(pdf_path)} [耗时: {elapsed:.2f}s]")
+                await asyncio.gather(*workers)
+        finally:
+            for pool in pools:
+                if pool is not None:
+                    pool.shutdown()
+
+        return writer.success_count
+
+    @staticmethod
+    async def _next_result(results, producer):
+        """等待下一条结果；生产者异常退出时直接抛出，避免永远等待"""
+        getter = asyncio.ensure_future(results.get())
+        if not producer.done():
+            await asyncio.wait({getter, producer}, return_when=asyncio.FIRST_COMPLETED)
+        if producer.done() and not producer.cancelled() and producer.exception() is not None:
+            getter.cancel()
+            raise producer.exception()
+        return await getter
+
+    def process_files(self, pdf_files, output_path):
+        return asyncio.run(self.process_files_async(pdf_files, output_path))
+
+
+class FusedCatalysisParser(AsyncCatalysisParser):
+    """多模型融合：每篇PDF只提取一次文本，同一提示词并发发往全部模型，答案到齐即投票写出一致性结果"""
+    def __init__(self, api_key, model_names, priority_map=None, weights=None, **kwargs):
+        super().__init__(api_key, **kwargs)
+        self.model_names = list(model_names)
+        self.model_name = self.model_names[0]
+        self.rate_limiter = get_rate_limiter(self.model_name, self.requests_per_minute)
+        # 各模型按 model_names 顺序编号；priority_map 中的序号指向该顺序，未列出的字段平票时取首个模型
+        self.consensus = ConsensusEngine(self.required_columns, len(self.model_names), priority_map, weights)
+        self._consensus_lock = threading.Lock()
+        self.incomplete_papers = {}  # 文件名 -> 未返回结果的模型
+
+    def process_text(self, pdf_path, text, model_name=None):
+        if model_name is not None:
+            return super().process_text(pdf_path, text, model_name)
+        if not text:
+            print(f"警告: {pdf_path} 无有效文本")
+            return pd.DataFrame()
+
+        # 单篇耗时取决于最慢的模型而非各模型之和
+        with ThreadPoolExecutor(max_workers=len(self.model_names)) as executor:
+            frames = list(executor.map(
+                lambda name: super(FusedCatalysisParser, self).process_text(pdf_path, text, name),
+                self.model_names
+            ))
+
+        slots = [None if df.empty else df.to_dict(orient='records')[0] for df in frames]
+        failed = [name for name, slot in zip(self.model_names, slots) if slot is None]
+        if len(failed) == len(self.model_names):
+            return pd.DataFrame()
+        if failed:
+            print(f"{os.path.basename(pdf_path)}: {', '.join(failed)} 未返回结果，按其余模型投票")
+        with self._consensus_lock:
+            if failed:
+                self.incomplete_papers[os.path.basename(pdf_path)] = failed
+            merged = self.consensus.merge(slots)
+        return pd.DataFrame([merged], columns=self.required_columns)
+
 
 def main(config):
     start_time = time.perf_counter()
@@ -265,13 +660,94 @@ def main(config):
     
     output_path = os.path.abspath(config["output_csv"])
     os.makedirs(os.path.dirname(output_path), exist_ok=True)
+    manifest_path = os.path.abspath(config.get("manifest_path") or output_path + ".manifest.jsonl")
+    run_mode = config.get("run_mode", "fresh")
     
-    if os.path.exists(output_path):
-        os.remove(output_path)
+    # 全新运行才清空历史结果；resume / retry-failed 保留清单
+    if run_mode == "fresh":
+        for path in (output_path, manifest_path):
+            if os.path.exists(path):
+                os.remove(path)
     
-    parser = SerialCatalysisParser(config["api_key"])
+    client = None
+    if config.get("endpoints_path"):
+        client = load_client_pool(config["endpoints_path"], config.get("routing", "least_loaded"))
+        print(f"客户端池: {len(client.endpoints)} 个端点, 路由策略 {client.strategy}")
+
+    if len(config.get("models") or []) > 1:
+        parser = FusedCatalysisParser(
+            config["api_key"],
+            config["models"],
+            priority_map=config.get("consensus_priority_map"),
+            weights=config.get("consensus_weights"),
+            max_in_flight=max(1, config.get("max_in_flight", 1)),
+            requests_per_minute=config.get("requests_per_minute", 60),
+            extract_workers=config.get("extract_workers", 2),
+            client=client
+        )
+        print(f"多模型融合模式: {', '.join(parser.model_names)}")
+    elif config.get("max_in_flight", 1) > 1:
+        parser = AsyncCatalysisParser(
+            config["api_key"],
+            max_in_flight=config["max_in_flight"],
+            requests_per_minute=config.get("requests_per_minute", 60),
+            extract_workers=config.get("extract_workers", 2),
+            client=client
+        )
+    else:
+        parser = SerialCatalysisParser(config["api_key"], client)
+
+    parser.manifest = RunManifest(manifest_path)
+    if run_mode != "fresh":
+        total_found = len(pdf_files)
+        pdf_files = parser.manifest.select(pdf_files, retry_failed_only=(run_mode == "retry-failed"))
+        rebuild_output(output_path, parser.required_columns, parser.manifest)
+        print(f"续跑模式({run_mode}): 共 {total_found} 篇, 本次处理 {len(pdf_files)} 篇")
+        if not pdf_files:
+            print("没有需要处理的PDF")
+            return
+
+    parser.strip_boilerplate = config.get("strip_boilerplate", False)
+    parser.context_selection = config.get("context_selection", "truncate")
+    parser.max_context_tokens = config.get("max_context_tokens", 15000)
+    parser.cascade_model = config.get("cascade_model")
+    parser.stream_responses = config.get("stream_responses", False)
+    parser.json_mode = config.get("json_mode", False)
+    parser.retry_policy.deadline = config.get("retry_deadline", parser.retry_policy.deadline)
+
+    if config.get("telemetry_path"):
+        parser.telemetry = Telemetry(os.path.abspath(config["telemetry_path"]))
+
+    if config.get("text_cache_dir"):
+        parser.text_cache = TextCache(config["text_cache_dir"])
+
+    if config.get("use_response_cache", False):
+        parser.response_cache = ResponseCache(
+            os.path.abspath(config.get("response_cache_path", "./cache/responses.sqlite")),
+            max_bytes=config.get("response_cache_max_mb", 512) * 1024 * 1024
+        )
     
     success_count = parser.process_files(pdf_files, output_path)
+
+    if parser.text_cache is not None:
+        print(f"文本缓存: 命中 {parser.text_cache.hits} 次, 未命中 {parser.text_cache.misses} 次")
+    if parser.response_cache is not None:
+        print(f"响应缓存: 命中 {parser.response_cache.hits} 次, 未命中 {parser.response_cache.misses} 次")
+        parser.response_cache.close()
+    if client is not None:
+        print(client.describe())
+    if parser.cascade_model and parser.cascade_stats["papers"]:
+        stats = parser.cascade_stats
+        print(f"级联抽取: {stats['papers']} 篇中 {stats['escalated']} 篇升级至 {parser.model_name} "
+              f"(共 {stats['fields']} 个字段)")
+    if isinstance(parser, FusedCatalysisParser):
+        stats = parser.consensus.stats
+        print(f"一致性投票: 字段一致 {stats['unanimous_fields']} | 多数票 {stats['voted_fields']} | "
+              f"平票按优先级 {stats['tie_fields']} | 需人工复核 {stats['review_rows']} 篇")
+        if parser.incomplete_papers:
+            print(f"部分模型未返回结果: {stats['incomplete']} 篇")
+            for name, failed in sorted(parser.incomplete_papers.items()):
+                print(f"  {name}: 缺少 {', '.join(failed)}")
     
     total_time = time.perf_counter() - start_time
     print(f"\n处理完成：成功 {success_count}/{len(pdf_files)} 篇文献")
@@ -279,9 +755,36 @@ def main(config):
     print(f"平均处理速度: {len(pdf_files)/total_time:.2f} 文件/秒")
 
 if __name__ == "__main__":
+    cli = argparse.ArgumentParser()
+    mode = cli.add_mutually_exclusive_group()
+    mode.add_argument("--resume", action="store_true", help="跳过已成功的PDF，处理失败及未处理的PDF")
+    mode.add_argument("--retry-failed", action="store_true", help="仅重试运行清单中失败的PDF")
+    args = cli.parse_args()
+
     config = {
         "api_key": "----------------------------------------------",
         "input_folder": "./pdf_files",
-        "output_csv": "results-deepseek-r1.csv"
+        "output_csv": "results-deepseek-r1.csv",
+        "models": [],  # 多模型融合模式（如 ["deepseek/deepseek-r1", "google/gemini-2.0-flash-001", "openai/gpt-4o"]），输出为投票后的一致性结果
+        "consensus_priority_map": None,  # 字段 -> 平票时采用的模型序号（对应 models 顺序，默认首个模型）
+        "consensus_weights": None,  # 各模型投票权重（默认均为1）
+        "max_in_flight": 8,  # 同时在途的请求数（1 表示串行）
+        "requests_per_minute": 60,  # 该模型的服务商限速
+        "endpoints_path": None,  # 多密钥/多端点配置（JSON，见 utils/client_pool.py），设置后按端点各自限速
+        "routing": "least_loaded",  # least_loaded：最少在途；weighted：按权重随机
+        "extract_workers": 2,  # PDF解析进程数，与网络请求并行
+        "use_response_cache": True,  # 复用相同模型/温度/提示词的历史响应
+        "response_cache_path": "./cache/responses.sqlite",
+        "response_cache_max_mb": 512,
+        "text_cache_dir": "./cache/text",  # PDF逐页文本缓存（留空则不缓存）
+        "strip_boilerplate": True,  # 去除页眉页脚/行号并截去参考文献
+        "context_selection": "rank",  # rank：BM25挑选相关片段；map_reduce：长文分窗抽取后合并；truncate：截取前60000字符
+        "max_context_tokens": 15000,  # 送入模型的正文token预算
+        "stream_responses": True,  # 流式读取，格式异常提前重试；token 用量取自末尾 usage 块
+        "json_mode": True,  # 请求JSON格式输出（不支持的服务商自动回退）
+        "retry_deadline": 900,  # 单篇文献（含全部重试与等待）的总时限，秒
+        "cascade_model": None,  # 级联模式的快速模型（如 "deepseek/deepseek-chat"），校验不通过的字段再用 deepseek-r1 重抽
+        "telemetry_path": "./telemetry/calls.jsonl",  # 逐次调用遥测（python -m utils.telemetry summary 汇总）
+        "run_mode": "resume" if args.resume else "retry-failed" if args.retry_failed else "fresh"
     }
     main(config)
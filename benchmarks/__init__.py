@@ -0,0 +1,2 @@
+# -*- coding: utf-8 -*-
+"""离线基准测试：本地模拟LLM服务、合成PDF语料与吞吐量测量脚本"""
@@ -0,0 +1,197 @@
+# -*- coding: utf-8 -*-
+"""
+PDF文本提取微基准
+
+在合成（或指定目录下的真实）PDF语料上比较提取策略与进程数，报告 页/秒、MB/秒、
+工作进程峰值内存、每页原始字符数与去除页眉页脚/参考文献后保留的字符数；结果写入JSON，
+指定 --baseline 时与上次结果比较，吞吐下降超过容差即以非零状态退出。
+
+    python -m benchmarks.extract_bench --papers 40 --pages 12 --workers 1 2 4 --repeat 3
+    python -m benchmarks.extract_bench --baseline benchmarks/results/extract-prev.json
+
+策略：text（page.get_text，即 utils.pdf_text 当前实现）、blocks（按块输出顺序拼接）、
+sorted_blocks（按版面坐标排序的块）、clean（text + clean_text，即读取脚本 strip_boilerplate 路径）。
+"""
+import argparse
+import glob
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import fitz
+
+try:
+    import resource
+except ImportError:  # Windows 无 resource 模块，改用 psutil
+    resource = None
+try:
+    import psutil
+except ImportError:  # 两者皆无时峰值内存记为 n/a
+    psutil = None
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from benchmarks.fixtures import make_synthetic_pdfs
+from utils.pdf_text import EXTRACTOR_VERSION, clean_text, extract_pages
+
+STRATEGIES = ("text", "blocks", "sorted_blocks", "clean")
+
+
+def _block_pages(pdf_path, sort):
+    with fitz.open(pdf_path) as doc:
+        return ["\n".join(block[4].strip() for block in page.get_text("blocks", sort=sort) if block[6] == 0)
+                for page in doc]
+
+
+def peak_rss_mb():
+    """本进程峰值常驻内存（MB）；无法测量时返回 None"""
+    if resource is not None:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+    if psutil is not None:
+        info = psutil.Process().memory_info()
+        return getattr(info, "peak_wset", info.rss) / (1024 * 1024)  # Windows 提供峰值工作集
+    return None
+
+
+def strategy_pages(strategy, pdf_path):
+    if strategy in ("text", "clean"):
+        return extract_pages(pdf_path)
+    return _block_pages(pdf_path, sort=(strategy == "sorted_blocks"))
+
+
+def extract_one(strategy, pdf_path):
+    """工作进程内执行单篇提取（计时部分），返回 (页数, 原始字符数, 峰值内存MB)"""
+    pages = strategy_pages(strategy, pdf_path)
+    if strategy == "clean":
+        clean_text(pages)
+    return len(pages), sum(len(text) for text in pages), peak_rss_mb()
+
+
+def kept_chars(strategy, pdf_files):
+    """去除页眉页脚/参考文献后保留的字符数（不计时）"""
+    return sum(clean_text(strategy_pages(strategy, path))[1]["kept_chars"] for path in pdf_files)
+
+
+def _warm_up(_):
+    return os.getpid()
+
+
+def run_once(strategy, workers, pdf_files):
+    if workers <= 0:
+        start = time.perf_counter()
+        rows = [extract_one(strategy, path) for path in pdf_files]
+        return time.perf_counter() - start, rows
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        list(executor.map(_warm_up, range(workers)))  # 进程启动不计入耗时
+        start = time.perf_counter()
+        rows = list(executor.map(extract_one, [strategy] * len(pdf_files), pdf_files))
+        return time.perf_counter() - start, rows
+
+
+def measure(strategy, workers, pdf_files, repeat):
+    total_bytes = sum(os.path.getsize(path) for path in pdf_files)
+    timings, rows = [], None
+    for _ in range(repeat):
+        elapsed, rows = run_once(strategy, workers, pdf_files)
+        timings.append(elapsed)
+    pages = sum(row[0] for row in rows)
+    peaks = [row[2] for row in rows if row[2] is not None]
+    best, median = min(timings), statistics.median(timings)
+    return {
+        "strategy": strategy,
+        "workers": workers,
+        "files": len(pdf_files),
+        "pages": pages,
+        "megabytes": round(total_bytes / 1e6, 3),
+        "best_seconds": round(best, 4),
+        "median_seconds": round(median, 4),
+        "pages_per_second": round(pages / best, 2),
+        "mb_per_second": round(total_bytes / 1e6 / best, 3),
+        "peak_rss_mb": round(max(peaks), 1) if peaks else None,
+        "raw_chars_per_page": round(sum(row[1] for row in rows) / pages, 1),
+        "kept_chars_per_page": round(kept_chars(strategy, pdf_files) / pages, 1),
+    }
+
+
+def compare(results, baseline_path, tolerance):
+    """与基线比较 页/秒，返回退化条目"""
+    with open(baseline_path, 'r', encoding='utf-8') as f:
+        baseline = {(r["strategy"], r["workers"]): r for r in json.load(f)["results"]}
+    regressions = []
+    print(f"\n与基线比较: {baseline_path}")
+    for r in results:
+        base = baseline.get((r["strategy"], r["workers"]))
+        if base is None:
+            continue
+        change = r["pages_per_second"] / base["pages_per_second"] - 1
+        flag = ""
+        if change < -tolerance:
+            flag = "  <-- 退化"
+            regressions.append(r)
+        print(f"{r['strategy']:<14}{r['workers']:>4}  {base['pages_per_second']:>10} → {r['pages_per_second']:<10}"
+              f"{change:+.1%}{flag}")
+    return regressions
+
+
+def print_table(results):
+    print(f"\n{'策略':<14}{'进程':>4}{'页/秒':>10}{'MB/秒':>9}{'峰值MB':>9}{'原始字符/页':>13}{'保留字符/页':>13}")
+    for r in results:
+        print(f"{r['strategy']:<14}{r['workers']:>4}{r['pages_per_second']:>10}{r['mb_per_second']:>9}"
+              f"{'n/a' if r['peak_rss_mb'] is None else r['peak_rss_mb']:>9}{r['raw_chars_per_page']:>13}{r['kept_chars_per_page']:>13}")
+
+
+def main():
+    cli = argparse.ArgumentParser(description="PDF文本提取微基准")
+    cli.add_argument("--corpus", help="PDF目录（不指定时生成合成语料）")
+    cli.add_argument("--papers", type=int, default=20, help="合成PDF篇数")
+    cli.add_argument("--pages", type=int, default=10, help="每篇页数")
+    cli.add_argument("--strategies", nargs="+", default=list(STRATEGIES), choices=STRATEGIES)
+    cli.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4], help="进程数（0 表示在当前进程内）")
+    cli.add_argument("--repeat", type=int, default=3, help="重复次数（取最快一次计算吞吐）")
+    cli.add_argument("--output", default="benchmarks/results/extract.json", help="结果JSON")
+    cli.add_argument("--baseline", help="上次的结果JSON，用于回归比较")
+    cli.add_argument("--tolerance", type=float, default=0.10, help="允许的吞吐下降比例")
+    args = cli.parse_args()
+
+    if args.corpus:
+        pdf_files = sorted(glob.glob(os.path.join(args.corpus, "*.[pP][dD][fF]")))
+        if not pdf_files:
+            print(f"未找到PDF文件: {args.corpus}")
+            sys.exit(2)
+    else:
+        corpus = os.path.join(tempfile.gettempdir(), "daks-bench-corpus")
+        pdf_files = make_synthetic_pdfs(corpus, args.papers, args.pages)
+    print(f"语料: {len(pdf_files)} 篇 | 策略: {', '.join(args.strategies)} | 进程数: {args.workers}")
+
+    results = []
+    for strategy in args.strategies:
+        for workers in args.workers:
+            result = measure(strategy, workers, pdf_files, max(1, args.repeat))
+            results.append(result)
+            print(f"{strategy} × {workers}: {result['pages_per_second']} 页/秒")
+
+    print_table(results)
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump({
+            "environment": {
+                "python": platform.python_version(), "pymupdf": fitz.VersionBind,
+                "platform": platform.platform(), "cpu_count": os.cpu_count(),
+                "extractor_version": EXTRACTOR_VERSION, "timestamp": time.time(),
+            },
+            "config": vars(args),
+            "results": results,
+        }, f, ensure_ascii=False, indent=2)
+    print(f"\n结果已保存: {os.path.abspath(args.output)}")
+
+    if args.baseline and compare(results, args.baseline, args.tolerance):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
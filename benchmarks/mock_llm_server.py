@@ -0,0 +1,222 @@
+# -*- coding: utf-8 -*-
+"""
+本地 OpenAI 兼容模拟服务（仅 /v1/chat/completions）
+
+按提示词类型合成响应：读取脚本的抽取提示词返回含全部字段的JSON（DOI取自正文），
+评分提示词返回分数或JSON分数数组；也可从读取脚本的响应缓存（SQLite）回放真实响应。
+可配置延迟、错误率与 429 注入（附 Retry-After），支持 stream=True。
+
+    python -m benchmarks.mock_llm_server --port 8000 --latency 0.5 --error-rate 0.02 --rate-limit-rate 0.05
+
+GET /stats 返回请求计数。
+"""
+import argparse
+import json
+import os
+import random
+import re
+import sys
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from utils.response_cache import ResponseCache
+
+FIELD_LINE = re.compile(r'^\s*-\s*([A-Za-z_][A-Za-z0-9_]*)\s*:', re.MULTILINE)
+DOI = re.compile(r'\b10\.\d{4,9}/[^\s"<>]+')
+BATCH_ITEM = re.compile(r'^\s*(\d+)\.\s*【评估字段】', re.MULTILINE)
+SYNTHETIC_VALUES = {
+    "catalyst": "Fe-N-C", "catalyst_substrate": "N-doped carbon", "SA_element": "Fe", "SA_valence": "+2",
+    "co_elements": "N", "oxidant": "PMS", "pollutants": "10 mg/L (bisphenol A)",
+    "pollutant_constant": "0.25 min-1 (bisphenol A)", "dose_catalyst": "0.1 g/L", "dose_oxidant": "0.5 mM",
+    "pH": "7.0", "catalyst_cycles": "5", "ORS": "1O2, SO4·−", "EPR_signals": "DMPO-OH, TEMP-1O2",
+    "quencher": "85% (methanol), slight inhibition (tert-butanol)",
+}
+
+
+class MockBehavior:
+    def __init__(self, latency=0.2, jitter=0.1, error_rate=0.0, rate_limit_rate=0.0, retry_after=1.0,
+                 tokens_per_second=0.0, replay=None, seed=0):
+        self.latency = latency  # 平均首字节延迟，秒
+        self.jitter = jitter
+        self.error_rate = error_rate  # 返回 500 的比例
+        self.rate_limit_rate = rate_limit_rate  # 返回 429 的比例
+        self.retry_after = retry_after
+        self.tokens_per_second = tokens_per_second  # >0 时按生成速度追加耗时
+        self.replay = ResponseCache(replay) if replay else None
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.stats = {"requests": 0, "completed": 0, "rate_limited": 0, "errors": 0, "replayed": 0, "streamed": 0}
+
+    def count(self, key):
+        with self.lock:
+            self.stats[key] += 1
+
+    def draw(self):
+        with self.lock:
+            return self.rng.random(), self.rng.uniform(-self.jitter, self.jitter)
+
+    def completion_text(self, body):
+        prompt = "\n".join(str(m.get("content", "")) for m in body.get("messages", []))
+        if self.replay is not None:
+            cached = self.replay.get(ResponseCache.make_key(body.get("model"), body.get("temperature"), prompt))
+            if cached is not None:
+                self.count("replayed")
+                return cached["content"]
+        if "【待评分列表】" in prompt:
+            ids = [int(i) for i in BATCH_ITEM.findall(prompt)]
+            return json.dumps([{"id": i, "score": 100 if i % 4 else 70} for i in ids])
+        if "评分" in prompt:
+            return "100"
+        fields = [f for f in FIELD_LINE.findall(prompt.split("***Example JSON Structure***")[0])]
+        if fields:
+            doi = DOI.search(prompt.split("***Text to be Parsed***")[-1])
+            record = {f: SYNTHETIC_VALUES.get(f) for f in fields}
+            if "DOI" in record or "literature_DOI" in record:
+                record["DOI" if "DOI" in record else "literature_DOI"] = doi.group(0).rstrip('.,;') if doi else None
+            return json.dumps(record, ensure_ascii=False)
+        return "OK"
+
+
+def make_handler(behavior):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, fmt, *args):
+            pass
+
+        def send_json(self, status, payload, headers=None):
+            data = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            for key, value in (headers or {}).items():
+                self.send_header(key, value)
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_GET(self):
+            if self.path.rstrip("/").endswith("/stats"):
+                with behavior.lock:
+                    self.send_json(200, dict(behavior.stats))
+            else:
+                self.send_json(404, {"error": {"message": "not found"}})
+
+        def do_POST(self):
+            length = int(self.headers.get("Content-Length", 0))
+            try:
+                body = json.loads(self.rfile.read(length) or b"{}")
+            except ValueError:
+                self.send_json(400, {"error": {"message": "invalid request body", "type": "invalid_request_error"}})
+                return
+            if not self.path.rstrip("/").endswith("/chat/completions"):
+                self.send_json(404, {"error": {"message": "not found"}})
+                return
+
+            behavior.count("requests")
+            roll, jitter = behavior.draw()
+            if roll < behavior.rate_limit_rate:
+                behavior.count("rate_limited")
+                self.send_json(429, {"error": {"message": "Rate limit exceeded", "type": "rate_limit_error"}},
+                               {"Retry-After": f"{behavior.retry_after:g}"})
+                return
+            time.sleep(max(0.0, behavior.latency + jitter))
+            if roll < behavior.rate_limit_rate + behavior.error_rate:
+                behavior.count("errors")
+                self.send_json(500, {"error": {"message": "Injected server error", "type": "server_error"}})
+                return
+
+            content = behavior.completion_text(body)
+            prompt_chars = sum(len(str(m.get("content", ""))) for m in body.get("messages", []))
+            usage = {"prompt_tokens": prompt_chars // 4, "completion_tokens": max(1, len(content) // 4)}
+            usage["total_tokens"] = usage["prompt_tokens"] + usage["completion_tokens"]
+            if behavior.tokens_per_second > 0:
+                time.sleep(usage["completion_tokens"] / behavior.tokens_per_second)
+            completion_id = f"chatcmpl-{uuid.uuid4().hex[:12]}"
+
+            if body.get("stream"):
+                behavior.count("streamed")
+                self.stream(completion_id, body.get("model"), content, usage)
+            else:
+                self.send_json(200, {
+                    "id": completion_id, "object": "chat.completion", "created": int(time.time()),
+                    "model": body.get("model"),
+                    "choices": [{"index": 0, "finish_reason": "stop",
+                                 "message": {"role": "assistant", "content": content}}],
+                    "usage": usage,
+                })
+            behavior.count("completed")
+
+        def stream(self, completion_id, model, content, usage):
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Connection", "close")
+            self.end_headers()
+            self.close_connection = True
+            pieces = [content[i:i + 16] for i in range(0, len(content), 16)] or [""]
+            try:
+                for i, piece in enumerate(pieces):
+                    chunk = {
+                        "id": completion_id, "object": "chat.completion.chunk", "created": int(time.time()),
+                        "model": model,
+                        "choices": [{"index": 0, "delta": {"content": piece},
+                                     "finish_reason": "stop" if i == len(pieces) - 1 else None}],
+                    }
+                    self.wfile.write(f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n".encode("utf-8"))
+                final = {"id": completion_id, "object": "chat.completion.chunk", "created": int(time.time()),
+                         "model": model, "choices": [], "usage": usage}
+                self.wfile.write(f"data: {json.dumps(final)}\n\ndata: [DONE]\n\n".encode("utf-8"))
+                self.wfile.flush()
+            except (BrokenPipeError, ConnectionResetError):
+                pass  # 客户端读到完整JSON后提前断开
+
+    return Handler
+
+
+def start_server(behavior, host="127.0.0.1", port=0):
+    """在后台线程启动服务，返回 (server, base_url)；port=0 时自动分配端口"""
+    server = ThreadingHTTPServer((host, port), make_handler(behavior))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}/v1"
+
+
+def add_behavior_arguments(cli):
+    cli.add_argument("--latency", type=float, default=0.2, help="平均响应延迟（秒）")
+    cli.add_argument("--jitter", type=float, default=0.1, help="延迟抖动幅度（秒）")
+    cli.add_argument("--error-rate", type=float, default=0.0, help="注入 500 错误的比例")
+    cli.add_argument("--rate-limit-rate", type=float, default=0.0, help="注入 429 的比例")
+    cli.add_argument("--retry-after", type=float, default=1.0, help="429 响应的 Retry-After（秒）")
+    cli.add_argument("--tokens-per-second", type=float, default=0.0, help="模拟生成速度（0 表示不计）")
+    cli.add_argument("--replay", help="读取脚本的响应缓存（SQLite），命中时回放真实响应")
+    cli.add_argument("--seed", type=int, default=0)
+
+
+def behavior_from_args(args):
+    return MockBehavior(
+        latency=args.latency, jitter=args.jitter, error_rate=args.error_rate,
+        rate_limit_rate=args.rate_limit_rate, retry_after=args.retry_after,
+        tokens_per_second=args.tokens_per_second, replay=args.replay, seed=args.seed
+    )
+
+
+def main():
+    cli = argparse.ArgumentParser(description="本地 OpenAI 兼容模拟服务")
+    cli.add_argument("--host", default="127.0.0.1")
+    cli.add_argument("--port", type=int, default=8000)
+    add_behavior_arguments(cli)
+    args = cli.parse_args()
+
+    server, base_url = start_server(behavior_from_args(args), args.host, args.port)
+    print(f"模拟服务已启动: {base_url}（Ctrl+C 退出）")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
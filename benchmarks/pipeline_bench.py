@@ -0,0 +1,206 @@
+# -*- coding: utf-8 -*-
+"""
+端到端吞吐基准（离线）
+
+启动本地模拟LLM服务，生成合成PDF语料，依次运行读取脚本的各处理引擎与评分脚本，
+报告 篇/秒、单元格/秒 以及重试代价（失败调用数、重试调用数、失败调用耗时、服务端注入的 429/500）。
+
+    python -m benchmarks.pipeline_bench --papers 40 --engines serial async:4 async:8 fused:4 \
+        --latency 0.5 --error-rate 0.02 --rate-limit-rate 0.05 --score
+
+引擎写法：serial | async:<在途数> | fused:<在途数>（三个模型名同时发往模拟服务）。
+"""
+import argparse
+import importlib.util
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+from collections import defaultdict
+
+import pandas as pd
+from openai import OpenAI
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+from benchmarks.fixtures import make_synthetic_pdfs
+from benchmarks.mock_llm_server import add_behavior_arguments, behavior_from_args, start_server
+from utils.pdf_text import TextCache
+from utils.rate_limit import TokenBucket
+from utils.response_cache import ResponseCache
+from utils.telemetry import Telemetry, load_records
+
+FUSED_MODELS = ["deepseek/deepseek-r1", "google/gemini-2.0-flash-001", "openai/gpt-4o"]
+
+
+def load_script(name, relative_path):
+    """按文件路径加载脚本模块（文件名含 - 和 . 无法直接 import）"""
+    spec = importlib.util.spec_from_file_location(name, os.path.join(ROOT, relative_path))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def retry_cost(telemetry_path):
+    """由遥测记录统计重试代价"""
+    records = load_records(telemetry_path) if os.path.exists(telemetry_path) else []
+    failed = [r for r in records if r.get("error")]
+    errors = defaultdict(int)
+    for r in failed:
+        errors[r["error"]] += 1
+    return {
+        "calls": len(records),
+        "failed_calls": len(failed),
+        "retry_calls": sum(1 for r in records if (r.get("attempt") or 1) > 1),
+        "failed_call_seconds": round(sum(r.get("latency") or 0 for r in failed), 3),
+        "errors": dict(errors),
+    }
+
+
+def server_delta(behavior, before):
+    with behavior.lock:
+        return {key: behavior.stats[key] - before.get(key, 0) for key in behavior.stats}
+
+
+def build_parser(reader, engine, base_url, args):
+    client = OpenAI(api_key="mock", base_url=base_url, max_retries=0)
+    kind, _, width = engine.partition(":")
+    width = int(width or 1)
+    common = dict(requests_per_minute=args.requests_per_minute, extract_workers=args.extract_workers, client=client)
+    if kind == "serial":
+        return reader.SerialCatalysisParser("mock", client)
+    if kind == "async":
+        return reader.AsyncCatalysisParser("mock", max_in_flight=width, **common)
+    if kind == "fused":
+        return reader.FusedCatalysisParser("mock", FUSED_MODELS, max_in_flight=width, **common)
+    raise ValueError(f"未知引擎: {engine}")
+
+
+def run_reader(reader, engine, pdf_files, base_url, behavior, workdir, args):
+    tag = engine.replace(":", "-")
+    output_path = os.path.join(workdir, f"results-{tag}.csv")
+    telemetry_path = os.path.join(workdir, f"telemetry-{tag}.jsonl")
+    parser = build_parser(reader, engine, base_url, args)
+    parser.telemetry = Telemetry(telemetry_path)
+    parser.strip_boilerplate = True
+    parser.context_selection = args.context_selection
+    parser.stream_responses = args.stream
+    if args.text_cache:
+        parser.text_cache = TextCache(os.path.join(workdir, "text-cache"))
+    if args.response_cache:
+        parser.response_cache = ResponseCache(os.path.join(workdir, "responses.sqlite"))
+
+    before = server_delta(behavior, {})
+    start = time.perf_counter()
+    success = parser.process_files(pdf_files, output_path)
+    wall = time.perf_counter() - start
+    if parser.response_cache is not None:
+        parser.response_cache.close()
+    return output_path, {
+        "stage": "reader", "engine": engine, "papers": len(pdf_files), "succeeded": success,
+        "wall_seconds": round(wall, 3), "papers_per_second": round(len(pdf_files) / wall, 3),
+        "retry_cost": retry_cost(telemetry_path), "server": server_delta(behavior, before),
+    }
+
+
+def perturb(df, fraction, seed):
+    """按比例改写单元格，制造需要模型评分的差异"""
+    rng = random.Random(seed)
+    df = df.copy()
+    for col in df.columns:
+        for idx in df.index:
+            value = df.at[idx, col]
+            if isinstance(value, str) and value and rng.random() < fraction:
+                df.at[idx, col] = value + " (approx.)" if rng.random() < 0.5 else value.upper()
+    return df
+
+
+def run_scorer(scorer_module, standard_path, base_url, behavior, workdir, args):
+    df_std = pd.read_csv(standard_path, encoding='utf-8-sig', dtype=str)
+    candidate_path = os.path.join(workdir, "results-candidate.csv")
+    perturb(df_std, args.perturb, args.seed).to_csv(candidate_path, index=False, encoding='utf-8-sig')
+    output_path = os.path.join(workdir, "final_scores-bench.csv")
+    telemetry_path = os.path.join(workdir, "telemetry-scorer.jsonl")
+
+    validator = scorer_module.DeepSeekValidator("mock", client=OpenAI(api_key="mock", base_url=base_url, max_retries=0))
+    validator.rate_limiter = TokenBucket(args.requests_per_minute)
+    validator.telemetry = Telemetry(telemetry_path)
+    validator.score_cache = ResponseCache(os.path.join(workdir, "scores.sqlite")) if args.response_cache else None
+    validator.batch_size = args.batch_size
+    validator.max_workers = args.score_workers
+
+    cells = df_std.shape[0] * df_std.shape[1]
+    before = server_delta(behavior, {})
+    start = time.perf_counter()
+    validator.process_files(candidate_path, standard_path, output_path)
+    wall = time.perf_counter() - start
+    if validator.score_cache is not None:
+        validator.score_cache.close()
+    return {
+        "stage": "scorer", "engine": f"batch:{args.batch_size} workers:{args.score_workers}",
+        "cells": cells, "wall_seconds": round(wall, 3), "cells_per_second": round(cells / wall, 3),
+        "retry_cost": retry_cost(telemetry_path), "server": server_delta(behavior, before),
+    }
+
+
+def print_table(results):
+    print(f"\n{'阶段':<8}{'引擎':<24}{'耗时(s)':>10}{'吞吐':>14}{'调用':>8}{'失败':>8}{'重试':>8}{'429':>6}{'500':>6}")
+    for r in results:
+        rate = f"{r['papers_per_second']} 篇/s" if r["stage"] == "reader" else f"{r['cells_per_second']} 格/s"
+        cost, server = r["retry_cost"], r["server"]
+        print(f"{r['stage']:<8}{r['engine']:<24}{r['wall_seconds']:>10}{rate:>14}{cost['calls']:>8}"
+              f"{cost['failed_calls']:>8}{cost['retry_calls']:>8}{server['rate_limited']:>6}{server['errors']:>6}")
+
+
+def main():
+    cli = argparse.ArgumentParser(description="读取/评分流程离线吞吐基准")
+    cli.add_argument("--papers", type=int, default=20, help="合成PDF篇数")
+    cli.add_argument("--pages", type=int, default=8, help="每篇页数")
+    cli.add_argument("--corpus", help="合成PDF目录（默认为临时目录，可复用）")
+    cli.add_argument("--engines", nargs="+", default=["serial", "async:4", "async:8"])
+    cli.add_argument("--extract-workers", type=int, default=2)
+    cli.add_argument("--requests-per-minute", type=int, default=6000)
+    cli.add_argument("--context-selection", default="rank", choices=["truncate", "rank", "map_reduce"])
+    cli.add_argument("--stream", action="store_true", help="读取脚本使用流式响应")
+    cli.add_argument("--text-cache", action="store_true", help="启用PDF文本缓存（多个引擎之间复用）")
+    cli.add_argument("--response-cache", action="store_true", help="启用响应/评分缓存")
+    cli.add_argument("--score", action="store_true", help="以首个引擎的输出为标准文件运行评分基准")
+    cli.add_argument("--batch-size", type=int, default=20)
+    cli.add_argument("--score-workers", type=int, default=8)
+    cli.add_argument("--perturb", type=float, default=0.3, help="候选文件中被改写的单元格比例")
+    cli.add_argument("--output", default="benchmarks/results/pipeline.json", help="结果JSON")
+    add_behavior_arguments(cli)
+    args = cli.parse_args()
+
+    behavior = behavior_from_args(args)
+    server, base_url = start_server(behavior)
+    workdir = tempfile.mkdtemp(prefix="daks-bench-")
+    corpus = args.corpus or os.path.join(workdir, "pdfs")
+    pdf_files = make_synthetic_pdfs(corpus, args.papers, args.pages, seed=args.seed)
+    print(f"模拟服务: {base_url} | 语料: {len(pdf_files)} 篇 × {args.pages} 页 | 工作目录: {workdir}")
+
+    reader = load_script("daks_reader", os.path.join("ProcessPDF", "Reader-2.2.1.py"))
+    results = []
+    standard_path = None
+    try:
+        for engine in args.engines:
+            output_path, result = run_reader(reader, engine, pdf_files, base_url, behavior, workdir, args)
+            results.append(result)
+            standard_path = standard_path or output_path
+        if args.score and standard_path:
+            scorer_module = load_script("daks_scorer", "score-V1.1.py")
+            results.append(run_scorer(scorer_module, standard_path, base_url, behavior, workdir, args))
+    finally:
+        server.shutdown()
+
+    print_table(results)
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump({"config": vars(args), "results": results}, f, ensure_ascii=False, indent=2)
+    print(f"\n结果已保存: {os.path.abspath(args.output)}")
+
+
+if __name__ == "__main__":
+    main()
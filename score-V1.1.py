@@ -5,24 +5,58 @@ Created on Mon Mar  3 09:57:21 2025
 @author: pc
 """
 # -*- coding: utf-8 -*-
+import numpy as np
 import pandas as pd
+import argparse
 import csv
+import json
+import os
 import re
+import sys
 import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from difflib import SequenceMatcher
 from openai import OpenAI
 import chardet
 
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from utils.telemetry import Telemetry, tracked_completion
+from utils.retry import RetryPolicy, get_circuit_breaker
+from utils.response_cache import ResponseCache
+from utils.rate_limit import get_rate_limiter
+from utils.quantities import compare_quantity_text
+from utils.client_pool import load_client_pool
+
 class DeepSeekValidator:
-    def __init__(self, api_key):
-        self.client = OpenAI(
+    def __init__(self, api_key, client=None):
+        # client 可传入 utils.client_pool.ClientPool（多密钥/多端点）
+        self.client = client or OpenAI(
             api_key=api_key,
             base_url="https://openrouter.ai/api/v1",
+            max_retries=0,  # 重试统一由 retry_policy 负责
         )
         self.model = "deepseek/deepseek-chat"
-        self.delay = 0.1  # 安全间隔
+        self.max_workers = 8  # 并发评分请求数
+        self.rate_limiter = get_rate_limiter(self.model, 300)  # 按模型共享的令牌桶（次/分钟），替代固定安全间隔
         self.encoding_cache = {}
         self.special_columns = {'ORS', 'EPR_signals'}
+        # 统一化学符号格式
+        self.special_replacements = {
+            'O2': 'O2', 'OH': 'OH', 
+            'SO4': 'SO4', 'SO4radical': 'SO4',
+            'DMPOOH': 'DMPOOH', 'TEMP1O2': 'TEMP1O2'
+        }
+        # 数值型字段：先尝试本地单位换算比对，无法解析时才请求模型
+        self.numeric_columns = {'dose_catalyst', 'dose_oxidant', 'pH', 'catalyst_cycles', 'pollutant_constant'}
+        self.telemetry = None  # 可选：Telemetry 实例（逐次调用记录）
+        self.batch_size = 20  # 每次请求评分的单元格数（1 表示逐格评分）
+        self.score_cache = None  # 可选：ResponseCache 实例（跨运行、跨模型复用单元格得分）
+        self.rules_version = "1"  # 修改评分规则或预处理逻辑时请提升版本，使旧缓存失效
+        # 单格请求短小，重试间隔与总时限都较读取脚本更短；同一端点共享熔断器
+        self.retry_policy = RetryPolicy(
+            max_attempts=3, base_delay=1.0, max_delay=60.0, deadline=180.0,
+            breaker=get_circuit_breaker(str(self.client.base_url))
+        )
 
     # region 文件处理模块
     def get_encoding(self, path):
@@ -77,17 +111,19 @@ class DeepSeekValidator:
         if col_name in self.special_columns:
             # 移除所有非字母数字字符（保留数字）
             cleaned = re.sub(r'[^a-zA-Z0-9]', '', str(text))
-            # 统一化学符号格式
-            replacements = {
-                'O2': 'O2', 'OH': 'OH', 
-                'SO4': 'SO4', 'SO4radical': 'SO4',
-                'DMPOOH': 'DMPOOH', 'TEMP1O2': 'TEMP1O2'
-            }
-            return replacements.get(cleaned, cleaned).upper()
+            return self.special_replacements.get(cleaned, cleaned).upper()
         return str(text)
 
-    def generate_scoring_prompt(self, text1, text2, col_name):
-        """生成动态提示词（优化版）"""
+    def preprocess_column(self, series, col_name):
+        """preprocess_special_column 的列向量化版本"""
+        series = series.astype(str)
+        if col_name in self.special_columns:
+            cleaned = series.str.replace(r'[^a-zA-Z0-9]', '', regex=True)
+            return cleaned.replace(self.special_replacements).str.upper()
+        return series
+
+    def scoring_rules(self, with_special):
+        """评分规则文本（单格与批量提示词共用）"""
         base_rules = """评分规则（基准分100分）：
         1. 完全一致 → 100分
         2. 数值错误 → 扣30分
@@ -95,13 +131,18 @@ class DeepSeekValidator:
         4. 格式差异 → 扣1-5分"""
 
         special_rules = ""
-        if col_name in self.special_columns:
-            special_rules = """
-            █ 特殊字段处理规则：
+        if with_special:
+            special_rules = f"""
+            █ 特殊字段（{'、'.join(sorted(self.special_columns))}）处理规则：
             - 忽略所有非字母数字符号（如?、.、·等）
             - 示例：?OH ≡ OH ≡ .OH → 不扣分
             - 示例：SO4·- ≡ SO4- → 不扣分
             """
+        return base_rules, special_rules
+
+    def generate_scoring_prompt(self, text1, text2, col_name):
+        """生成动态提示词（优化版）"""
+        base_rules, special_rules = self.scoring_rules(col_name in self.special_columns)
 
         return f"""请根据以下规则进行专业评分：
         【评估字段】{col_name}
@@ -115,35 +156,172 @@ class DeepSeekValidator:
     
     def get_cell_score(self, text1, text2, col_name):
         """增强型评分解析"""
+        # 预处理特殊字段
+        text1_clean = self.preprocess_special_column(text1, col_name)
+        text2_clean = self.preprocess_special_column(text2, col_name)
+        
+        # 快速匹配检查
+        if text1_clean == text2_clean:
+            return 100
+
+        score = self.local_score(text1, text2, col_name)
+        if score is not None:
+            return score
+
+        score = self.request_cell_score(text1, text2, col_name)
+        if score is None:
+            return self.get_fallback_score(text1_clean, text2_clean)
+        return score
+
+    def local_score(self, text1, text2, col_name):
+        """数值型字段的本地判定（单位换算后比较），无法判定时返回 None"""
+        if col_name not in self.numeric_columns:
+            return None
         try:
-            # 预处理特殊字段
-            text1_clean = self.preprocess_special_column(text1, col_name)
-            text2_clean = self.preprocess_special_column(text2, col_name)
-            
-            # 快速匹配检查
-            if text1_clean == text2_clean:
-                return 100
+            return compare_quantity_text(text1, text2)
+        except (ValueError, OverflowError):
+            return None
 
+    def request_cell_score(self, text1, text2, col_name):
+        """单格模型评分，失败或无法解析时返回 None"""
+        try:
             # 构造提示词
             prompt = self.generate_scoring_prompt(text1, text2, col_name)
             
-            response = self.client.chat.completions.create(
-                model=self.model,
-                messages=[{"role": "user", "content": prompt}],
-                temperature=0.1,
-                max_tokens=4
-            )
+            def attempt_once(attempt):
+                self.acquire_rate()
+                return tracked_completion(
+                    self.client, self.telemetry, "scorer", item=col_name, attempt=attempt,
+                    model=self.model,
+                    messages=[{"role": "user", "content": prompt}],
+                    temperature=0.1,
+                    max_tokens=4
+                )
+            response = self.retry_policy.call(attempt_once, label=col_name)
             raw_text = response.choices[0].message.content.strip()
             
             # 增强解析逻辑
             if match := re.search(r'\b(\d{1,3})\b', raw_text):
                 score = int(match.group(1))
                 return max(0, min(100, score))
-            return self.get_fallback_score(text1_clean, text2_clean)
+            return None
             
         except Exception as e:
             print(f"API请求失败: {e}")
-            return self.get_fallback_score(text1_clean, text2_clean)
+            return None
+
+    def acquire_rate(self):
+        """按模型限速；客户端池已按端点限速时跳过"""
+        if not getattr(self.client, "rate_limited", False):
+            self.rate_limiter.acquire()
+
+    def generate_batch_prompt(self, items):
+        """批量评分提示词：items 为 (列名, 待测文本, 标准文本) 列表"""
+        base_rules, special_rules = self.scoring_rules(
+            any(col in self.special_columns for col, _, _ in items)
+        )
+        lines = "\n".join(
+            f"        {i}. 【评估字段】{col} | 【标准文本】{json.dumps(text2, ensure_ascii=False)} | "
+            f"【待测文本】{json.dumps(text1, ensure_ascii=False)}"
+            for i, (col, text1, text2) in enumerate(items, 1)
+        )
+        return f"""请根据以下规则对每一组文本分别进行专业评分：
+        {base_rules}
+        {special_rules}
+
+        【待评分列表】
+{lines}
+
+        请只返回一个JSON数组，按编号给出每组0-100的整数分，例如：
+        [{{"id": 1, "score": 100}}, {{"id": 2, "score": 70}}]
+        不要包含任何文字说明。"""
+
+    def parse_batch_scores(self, raw_text, count):
+        """解析批量评分结果，返回 {编号: 分数}（仅保留合法条目）"""
+        start, end = raw_text.find('['), raw_text.rfind(']')
+        if start == -1 or end <= start:
+            return {}
+        try:
+            entries = json.loads(raw_text[start:end + 1])
+        except json.JSONDecodeError:
+            return {}
+        parsed = {}
+        for pos, entry in enumerate(entries, 1):
+            if isinstance(entry, dict):
+                item_id, score = entry.get("id"), entry.get("score")
+            else:
+                item_id, score = pos, entry  # 兼容纯数字数组
+            if isinstance(item_id, int) and 1 <= item_id <= count and isinstance(score, (int, float)):
+                parsed[item_id] = max(0, min(100, int(score)))
+        return parsed
+
+    def get_batch_scores(self, items):
+        """批量评分：一次请求返回JSON数组，解析失败的条目回退为逐格评分（仍失败的为 None）"""
+        if len(items) == 1:
+            col, text1, text2 = items[0]
+            return [self.request_cell_score(text1, text2, col)]
+
+        parsed = {}
+        prompt = self.generate_batch_prompt(items)
+
+        def attempt_once(attempt):
+            self.acquire_rate()
+            return tracked_completion(
+                self.client, self.telemetry, "scorer", item=f"batch[{len(items)}]", attempt=attempt,
+                model=self.model,
+                messages=[{"role": "user", "content": prompt}],
+                temperature=0.1,
+                max_tokens=16 * len(items) + 32
+            )
+
+        try:
+            response = self.retry_policy.call(attempt_once, label=f"batch[{len(items)}]")
+            parsed = self.parse_batch_scores(response.choices[0].message.content, len(items))
+        except Exception as e:
+            print(f"批量评分请求失败: {e}")
+
+        if len(parsed) < len(items):
+            print(f"批量评分缺失 {len(items) - len(parsed)} 项，回退逐格评分")
+        return [
+            parsed[i] if i in parsed else self.request_cell_score(text1, text2, col)
+            for i, (col, text1, text2) in enumerate(items, 1)
+        ]
+
+    def score_cache_key(self, col, text1, text2):
+        """缓存键：列名、双方预处理结果、评分模型、规则版本"""
+        return ResponseCache.make_key(
+            "cell_score", col,
+            self.preprocess_special_column(text1, col),
+            self.preprocess_special_column(text2, col),
+            self.model, self.rules_version
+        )
+
+    def score_items(self, items):
+        """评分入口：先查缓存，未命中的批量请求模型，模型失败的用本地相似度兜底（不写缓存）"""
+        scores = [None] * len(items)
+        misses = []
+        for i, (col, text1, text2) in enumerate(items):
+            if self.score_cache is not None:
+                cached = self.score_cache.get(self.score_cache_key(col, text1, text2))
+                if cached is not None:
+                    scores[i] = cached["score"]
+                    continue
+            misses.append(i)
+
+        if misses:
+            llm_scores = self.get_batch_scores([items[i] for i in misses])
+            for i, score in zip(misses, llm_scores):
+                col, text1, text2 = items[i]
+                if score is None:
+                    scores[i] = self.get_fallback_score(
+                        self.preprocess_special_column(text1, col),
+                        self.preprocess_special_column(text2, col)
+                    )
+                    continue
+                scores[i] = score
+                if self.score_cache is not None:
+                    self.score_cache.put(self.score_cache_key(col, text1, text2), {"score": score})
+        return scores
 
     def get_fallback_score(self, text1, text2):
         """降级评分策略（本地相似度计算）"""
@@ -154,6 +332,75 @@ class DeepSeekValidator:
     # endregion
 
     # region 主流程
+    def iter_batch_scores(self, items):
+        """将 (列名, 待测文本, 标准文本) 条目分批并发评分，按完成顺序产出 (条目下标列表, 分数列表)"""
+        batch_size = max(1, self.batch_size)
+        batches = [list(range(start, min(start + batch_size, len(items)))) for start in range(0, len(items), batch_size)]
+        with ThreadPoolExecutor(max_workers=max(1, self.max_workers)) as executor:
+            futures = {
+                executor.submit(self.score_items, [items[i] for i in batch]): batch
+                for batch in batches
+            }
+            for future in as_completed(futures):
+                batch = futures[future]
+                try:
+                    batch_scores = future.result()
+                except Exception as e:
+                    print(f"处理失败：批次（{len(batch)} 格） - {str(e)}")
+                    batch_scores = [50] * len(batch)  # 错误中间值
+                yield batch, batch_scores
+
+    def classify_cells(self, df_v3, df_std, columns):
+        """
+        列向量化预分类：一次性算出双方为空、单方为空、预处理后相等的掩码并批量填分；
+        剩余单元格中数值字段尝试本地判定，其余返回待模型评分列表。
+        返回 (得分矩阵[待评为-1], 待评列表[(行, 列序号, 列名, 待测文本, 标准文本)], 本地判定数)
+        """
+        n_rows = len(df_v3)
+        if len(df_std) != n_rows:
+            print(f"警告：行数不一致（待测 {n_rows} 行，标准 {len(df_std)} 行），缺失行记为 50 分")
+        v3 = df_v3.reset_index(drop=True).astype(str)
+        std = df_std.reset_index(drop=True).reindex(range(n_rows))
+        std_missing = std.isna().all(axis=1).to_numpy()
+        std = std.fillna('').astype(str)
+
+        v3_empty = v3.apply(lambda series: series.str.strip() == '').to_numpy()
+        std_empty = std.apply(lambda series: series.str.strip() == '').to_numpy()
+        equal = np.column_stack([
+            (self.preprocess_column(v3[col], col) == self.preprocess_column(std[col], col)).to_numpy()
+            for col in columns
+        ]) if columns else np.zeros((n_rows, 0), dtype=bool)
+
+        matrix = np.full((n_rows, len(columns)), -1, dtype=int)
+        matrix[std_empty & v3_empty] = 100
+        matrix[std_empty & ~v3_empty] = 0
+        matrix[~std_empty & v3_empty] = 0
+        matrix[~std_empty & ~v3_empty & equal] = 100
+        matrix[std_missing] = 50  # 错误中间值
+
+        v3_values = v3[columns].to_numpy()
+        std_values = std[columns].to_numpy()
+        pending = []
+        local_count = 0
+        for idx, c_idx in np.argwhere(matrix == -1):
+            col = columns[c_idx]
+            v3_val, std_val = v3_values[idx, c_idx], std_values[idx, c_idx]
+            local = self.local_score(v3_val, std_val, col)
+            if local is not None:
+                matrix[idx, c_idx] = local
+                local_count += 1
+            else:
+                pending.append((int(idx), int(c_idx), col, v3_val, std_val))
+
+        counts = {
+            "空值": int((std_empty | v3_empty).sum()),
+            "一致": int((~std_empty & ~v3_empty & equal).sum()),
+            "数值本地判定": local_count,
+            "待模型评分": len(pending),
+        }
+        print("预分类: " + " | ".join(f"{name} {count} 格" for name, count in counts.items()))
+        return matrix.tolist(), pending, local_count
+
     def process_files(self, v3_path, std_path, output_path):
         """主处理流程（增强版）"""
         # 读取数据
@@ -166,48 +413,136 @@ class DeepSeekValidator:
         
         # 初始化输出文件
         self.init_output(output_path, columns)
-        
-        # 逐行处理
+
+        scores, pending, _ = self.classify_cells(df_v3, df_std, columns)
+
+        batch_size = max(1, self.batch_size)
+        total_batches = (len(pending) + batch_size - 1) // batch_size
+        print(f"共 {len(df_v3)} 行，需模型评分 {len(pending)} 格，分 {total_batches} 批")
+
+        remaining = [0] * len(df_v3)  # 每行尚未评完的单元格数
+        for idx, _, _, _, _ in pending:
+            remaining[idx] += 1
+
+        start_time = time.perf_counter()
         with open(output_path, 'a', newline='', encoding='utf-8-sig') as f:
             writer = csv.writer(f)
-            
-            for idx in range(len(df_v3)):
-                row_scores = []
-                for col in columns:
-                    try:
-                        v3_val = str(df_v3.iloc[idx][col])
-                        std_val = str(df_std.iloc[idx][col])
-                        
-                        # 空值处理
-                        if not std_val.strip():
-                            score = 100 if not v3_val.strip() else 0
-                        elif not v3_val.strip():
-                            score = 0
-                        else:
-                            score = self.get_cell_score(v3_val, std_val, col)
-                            time.sleep(self.delay)
-                        
-                        row_scores.append(score)
-                        print(f"处理进度：行 {idx+1}/{len(df_v3)} | 列 {col} | 得分 {score}")
-                        
-                    except Exception as e:
-                        print(f"处理失败：行 {idx+1} 列 {col} - {str(e)}")
-                        row_scores.append(50)  # 错误中间值
-                
-                # 写入当前行
+            next_row = 0
+            items = [(col, v3_val, std_val) for _, _, col, v3_val, std_val in pending]
+
+            for positions, batch_scores in self.iter_batch_scores(items):
+                for pos, score in zip(positions, batch_scores):
+                    idx, c_idx = pending[pos][:2]
+                    scores[idx][c_idx] = score
+                    remaining[idx] -= 1
+
+                # 按行顺序写入已全部评完的行
+                written = next_row
+                while next_row < len(scores) and remaining[next_row] == 0:
+                    writer.writerow(scores[next_row])
+                    next_row += 1
+                if next_row > written:
+                    f.flush()  # 强制写入
+                    elapsed = time.perf_counter() - start_time
+                    eta = elapsed / next_row * (len(scores) - next_row)
+                    print(f"处理进度：行 {next_row}/{len(df_v3)} | 已用 {elapsed:.1f}s | 预计剩余 {eta:.1f}s")
+
+            for row_scores in scores[next_row:]:
                 writer.writerow(row_scores)
-                f.flush()  # 强制写入
 
+        if self.score_cache is not None:
+            print(f"评分缓存: 命中 {self.score_cache.hits} 次, 未命中 {self.score_cache.misses} 次")
         print(f"处理完成，结果保存至: {output_path}")
+
+    def process_many(self, candidate_paths, std_path, output_paths=None, summary_path="final_scores-summary.csv"):
+        """
+        多模型一次评分：标准文件只读取清洗一次，各模型待评单元格按
+        (列名, 双方预处理结果) 去重后只评一次，再分别写出各模型得分文件与汇总表。
+        """
+        df_std = self.safe_read_csv(std_path)
+        columns = df_std.columns.tolist()
+        if output_paths is None:
+            output_paths = [
+                os.path.join(os.path.dirname(path), f"final_scores-{self.model_label(path)}.csv")
+                for path in candidate_paths
+            ]
+
+        # 生成共享工作计划
+        plans = []
+        unique = {}  # 去重键 -> 条目下标
+        items = []
+        placements = []  # 与 items 对齐：[(模型序号, 行, 列序号), ...]
+        for m_idx, path in enumerate(candidate_paths):
+            df = self.safe_read_csv(path)
+            assert list(df.columns) == columns, f"列结构不一致: {path}"
+            scores, pending, _ = self.classify_cells(df, df_std, columns)
+            plans.append(scores)
+            for idx, c_idx, col, v3_val, std_val in pending:
+                key = (col, self.preprocess_special_column(v3_val, col), self.preprocess_special_column(std_val, col))
+                if key not in unique:
+                    unique[key] = len(items)
+                    items.append((col, v3_val, std_val))
+                    placements.append([])
+                placements[unique[key]].append((m_idx, idx, c_idx))
+
+        total_cells = sum(len(p) for p in placements)
+        print(f"{len(candidate_paths)} 个模型共需评分 {total_cells} 格，去重后 {len(items)} 格")
+
+        start_time = time.perf_counter()
+        done = 0
+        for positions, batch_scores in self.iter_batch_scores(items):
+            for pos, score in zip(positions, batch_scores):
+                for m_idx, idx, c_idx in placements[pos]:
+                    plans[m_idx][idx][c_idx] = score
+            done += len(positions)
+            elapsed = time.perf_counter() - start_time
+            print(f"处理进度：{done}/{len(items)} 格 | 已用 {elapsed:.1f}s | 预计剩余 {elapsed / done * (len(items) - done):.1f}s")
+
+        for scores, output_path in zip(plans, output_paths):
+            self.init_output(output_path, columns)
+            with open(output_path, 'a', newline='', encoding='utf-8-sig') as f:
+                csv.writer(f).writerows(scores)
+            print(f"结果保存至: {output_path}")
+
+        # 汇总表：各字段、各模型的平均分
+        summary = pd.DataFrame({
+            self.model_label(path): pd.DataFrame(scores, columns=columns).mean()
+            for path, scores in zip(candidate_paths, plans)
+        })
+        summary.loc["overall"] = summary.mean()
+        summary.round(2).to_csv(summary_path, index_label="field", encoding='utf-8-sig')
+        if self.score_cache is not None:
+            print(f"评分缓存: 命中 {self.score_cache.hits} 次, 未命中 {self.score_cache.misses} 次")
+        print(f"汇总表保存至: {summary_path}")
+        return summary
+
+    @staticmethod
+    def model_label(path):
+        """results-gpt-4o.csv → gpt-4o"""
+        name = os.path.splitext(os.path.basename(path))[0]
+        return name[len("results-"):] if name.startswith("results-") else name
     # endregion
 
 if __name__ == "__main__":
+    cli = argparse.ArgumentParser(description="模型抽取结果评分")
+    cli.add_argument("candidates", nargs="*", help="待评分的模型结果CSV（可多个，一次评完）")
+    cli.add_argument("--standard", default="results-standard.csv", help="标准结果CSV")
+    cli.add_argument("--summary", default="final_scores-summary.csv", help="多模型汇总表输出路径")
+    cli.add_argument("--endpoints", help="多密钥/多端点配置（JSON，见 utils/client_pool.py）")
+    args = cli.parse_args()
+
     validator = DeepSeekValidator(
-        api_key=""
-    )
-    validator.process_files(
-        "results-gpt-4o.csv",
-        "results-standard.csv",
-        "final_scores-GPT-4o.csv"
+        api_key="",
+        client=load_client_pool(args.endpoints) if args.endpoints else None
     )
+    validator.telemetry = Telemetry("telemetry/calls.jsonl")
+    validator.score_cache = ResponseCache("cache/scores.sqlite")  # 设为 None 可关闭评分缓存
+    if args.candidates:
+        validator.process_many(args.candidates, args.standard, summary_path=args.summary)
+    else:
+        validator.process_files(
+            "results-gpt-4o.csv",
+            args.standard,
+            "final_scores-GPT-4o.csv"
+        )
 
@@ -0,0 +1,5 @@
+# -*- coding: utf-8 -*-
+"""
+DAKS 各脚本共用的工具模块
+（脚本通过把仓库根目录加入 sys.path 后以 `from utils.xxx import ...` 方式引用）
+"""
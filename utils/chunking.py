@@ -0,0 +1,135 @@
+# -*- coding: utf-8 -*-
+"""
+全文分块与相关性排序（本地 BM25）
+
+用字段说明作为查询，对论文分块打分，只把最相关的片段在 token 预算内送入模型，
+替代简单的 text[:60000] 截断。
+"""
+import math
+import re
+from collections import Counter
+
+CHARS_PER_TOKEN = 4  # 英文文本的粗略估计
+
+STOPWORDS = {
+    'a', 'an', 'and', 'are', 'as', 'at', 'be', 'by', 'for', 'from', 'if', 'in',
+    'is', 'it', 'of', 'on', 'or', 'such', 'that', 'the', 'their', 'them', 'then',
+    'this', 'to', 'used', 'was', 'were', 'which', 'with', 'e', 'g', 'i', 'ie'
+}
+
+
+def tokenize(text):
+    return [t for t in re.findall(r'[a-z0-9]+', text.lower()) if t not in STOPWORDS]
+
+
+def estimate_tokens(text):
+    return len(text) // CHARS_PER_TOKEN
+
+
+def split_chunks(text, chunk_chars=1500):
+    """按页（换行）再按句切分，拼成不超过 chunk_chars 的片段"""
+    chunks = []
+    for page in text.split('\n'):
+        current = ""
+        for sentence in re.split(r'(?<=[.!?])\s+', page.strip()):
+            while len(sentence) > chunk_chars:  # 无标点的超长段落硬切
+                if current:
+                    chunks.append(current)
+                    current = ""
+                chunks.append(sentence[:chunk_chars])
+                sentence = sentence[chunk_chars:]
+            if current and len(current) + len(sentence) + 1 > chunk_chars:
+                chunks.append(current)
+                current = ""
+            current = f"{current} {sentence}" if current else sentence
+        if current.strip():
+            chunks.append(current)
+    return chunks
+
+
+class BM25:
+    def __init__(self, documents, k1=1.5, b=0.75):
+        self.k1 = k1
+        self.b = b
+        self.doc_tokens = [Counter(tokenize(doc)) for doc in documents]
+        self.doc_lens = [sum(tokens.values()) for tokens in self.doc_tokens]
+        self.avg_len = (sum(self.doc_lens) / len(self.doc_lens)) if self.doc_lens else 0
+        doc_freq = Counter()
+        for tokens in self.doc_tokens:
+            doc_freq.update(tokens.keys())
+        n = len(documents)
+        self.idf = {
+            term: math.log((n - df + 0.5) / (df + 0.5) + 1)
+            for term, df in doc_freq.items()
+        }
+
+    def scores(self, query):
+        terms = set(tokenize(query))
+        results = []
+        for tokens, length in zip(self.doc_tokens, self.doc_lens):
+            score = 0.0
+            norm = self.k1 * (1 - self.b + self.b * length / (self.avg_len or 1))
+            for term in terms:
+                tf = tokens.get(term)
+                if tf:
+                    score += self.idf[term] * tf * (self.k1 + 1) / (tf + norm)
+            results.append(score)
+        return results
+
+
+def build_queries(prompt_template, fields):
+    """从提示词模板中取出每个字段所在的说明行作为查询"""
+    lines = prompt_template.splitlines()
+    queries = []
+    for field in fields:
+        described = [line for line in lines if field in line]
+        queries.append(" ".join([field.replace('_', ' ')] + described))
+    return queries
+
+
+def select_relevant_text(text, queries, max_tokens=15000, chunk_chars=1500):
+    """在 token 预算内挑选最相关的片段，按原文顺序拼接返回"""
+    if not queries:
+        return text[:max_tokens * CHARS_PER_TOKEN]
+    chunks = split_chunks(text, chunk_chars)
+    if not chunks:
+        return text
+
+    index = BM25(chunks)
+    relevance = [0.0] * len(chunks)
+    for query in queries:
+        scores = index.scores(query)
+        top = max(scores) if scores else 0
+        if top > 0:
+            # 每个字段独立归一化，避免高频字段淹没其他字段
+            for i, score in enumerate(scores):
+                relevance[i] += score / top
+
+    budget = max_tokens * CHARS_PER_TOKEN
+    selected = {0}  # 首段通常包含标题、DOI与摘要
+    used = len(chunks[0])
+    for i in sorted(range(len(chunks)), key=lambda i: relevance[i], reverse=True):
+        if i in selected or relevance[i] <= 0:
+            continue
+        if used + len(chunks[i]) + 1 > budget:
+            continue
+        selected.add(i)
+        used += len(chunks[i]) + 1
+    return "\n".join(chunks[i] for i in sorted(selected))
+
+
+def pack_windows(text, window_chars, chunk_chars=1500):
+    """把片段按原文顺序装入不超过 window_chars 的窗口（供分窗 map-reduce 抽取）"""
+    windows = []
+    current = []
+    size = 0
+    for chunk in split_chunks(text, chunk_chars):
+        if current and size + len(chunk) + 1 > window_chars:
+            windows.append("\n".join(current))
+            current = []
+            size = 0
+        current.append(chunk)
+        size += len(chunk) + 1
+    if current:
+        windows.append("\n".join(current))
+    return windows
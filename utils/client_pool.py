@@ -0,0 +1,179 @@
+# -*- coding: utf-8 -*-
+"""
+多密钥/多端点客户端池
+
+配置若干 (base_url, api_key, 模型别名, 限速) 端点（含本地 OpenAI 兼容服务），对外提供与
+OpenAI 客户端相同的 chat.completions.create 接口：按最少在途或权重选择端点，端点各自限速；
+服务商类故障自动切换到其他端点，连续失败的端点暂时摘除并逐步延长恢复时间。
+
+端点配置文件（JSON 列表，三个脚本共用）：
+
+    [
+      {"name": "openrouter", "base_url": "https://openrouter.ai/api/v1", "api_key": "...",
+       "requests_per_minute": 60},
+      {"name": "local", "base_url": "http://127.0.0.1:8000/v1", "api_key": "EMPTY",
+       "models": {"deepseek/deepseek-chat": "deepseek-chat"}, "weight": 2}
+    ]
+
+models 为空表示接受任意模型名；否则只接受其中的别名，并改写为该端点的实际模型名。
+"""
+import json
+import random
+import threading
+import time
+from types import SimpleNamespace
+
+from openai import OpenAI
+
+from utils.rate_limit import TokenBucket
+from utils.retry import PROVIDER_FAILURES, classify_error
+
+
+class Endpoint:
+    def __init__(self, name, base_url, api_key, models=None, requests_per_minute=None, weight=1.0,
+                 failure_threshold=3, cooldown=30.0):
+        self.name = name
+        self.base_url = base_url
+        self.client = OpenAI(api_key=api_key, base_url=base_url, max_retries=0)  # 失败由池切换端点、由调用方重试
+        self.models = models  # 别名 -> 端点模型名；None 表示透传
+        self.limiter = TokenBucket(requests_per_minute) if requests_per_minute else None
+        self.weight = weight
+        self.failure_threshold = failure_threshold
+        self.base_cooldown = cooldown
+        self.cooldown = cooldown
+        self.in_flight = 0
+        self.failures = 0  # 连续失败次数
+        self.unhealthy_until = 0.0
+        self.stats = {"requests": 0, "errors": 0, "failovers": 0}
+
+    def supports(self, model):
+        return self.models is None or model in self.models
+
+    def resolve(self, model):
+        return model if self.models is None else self.models[model]
+
+    def healthy(self, now):
+        return now >= self.unhealthy_until
+
+
+class ClientPool:
+    """可直接替换 OpenAI 客户端：pool.chat.completions.create(model=..., ...)"""
+    rate_limited = True  # 端点自行限速，调用方无需再按模型限速
+
+    def __init__(self, endpoints, strategy="least_loaded"):
+        if not endpoints:
+            raise ValueError("客户端池至少需要一个端点")
+        if strategy not in ("least_loaded", "weighted"):
+            raise ValueError(f"未知的路由策略: {strategy}")
+        self.endpoints = endpoints
+        self.strategy = strategy
+        self.lock = threading.Lock()
+        self.base_url = "pool:" + ",".join(endpoint.name for endpoint in endpoints)
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    @classmethod
+    def from_config(cls, entries, strategy="least_loaded"):
+        return cls([Endpoint(**entry) for entry in entries], strategy)
+
+    def _choose(self, model, tried):
+        now = time.monotonic()
+        candidates = [e for e in self.endpoints if e.supports(model) and e not in tried]
+        if not candidates:
+            return None
+        healthy = [e for e in candidates if e.healthy(now)]
+        if not healthy:
+            # 全部暂时摘除时选最早恢复的，避免整体停摆
+            return min(candidates, key=lambda e: e.unhealthy_until)
+        if self.strategy == "weighted":
+            return random.choices(healthy, weights=[e.weight for e in healthy])[0]
+        return min(healthy, key=lambda e: (e.in_flight / e.weight, e.failures))
+
+    def _acquire(self, model, tried):
+        with self.lock:
+            endpoint = self._choose(model, tried)
+            if endpoint is not None:
+                endpoint.in_flight += 1
+                endpoint.stats["requests"] += 1
+            return endpoint
+
+    def _release(self, endpoint, error=None, neutral=False):
+        """释放在途计数；neutral 表示请求本身有误（如 400），不影响端点健康状态"""
+        with self.lock:
+            endpoint.in_flight -= 1
+            if neutral:
+                return
+            if error is None:
+                endpoint.failures = 0
+                endpoint.cooldown = endpoint.base_cooldown
+                return
+            endpoint.stats["errors"] += 1
+            endpoint.failures += 1
+            now = time.monotonic()
+            # 已摘除期间返回的在途失败不再重复计入
+            if endpoint.failures >= endpoint.failure_threshold and endpoint.healthy(now):
+                endpoint.unhealthy_until = now + endpoint.cooldown
+                endpoint.cooldown = min(endpoint.cooldown * 2, 300.0)
+                endpoint.failures = 0
+                print(f"端点 {endpoint.name} 连续失败，暂停使用 {endpoint.unhealthy_until - time.monotonic():.0f} 秒")
+
+    def create(self, **kwargs):
+        """选择端点发起请求；服务商类故障（限流、超时、连接、5xx）切换到下一个端点"""
+        model = kwargs.get("model")
+        tried = []
+        last_error = None
+        while True:
+            endpoint = self._acquire(model, tried)
+            if endpoint is None:
+                if last_error is not None:
+                    raise last_error
+                raise ValueError(f"没有端点提供模型: {model}")
+            tried.append(endpoint)
+            if endpoint.limiter is not None:
+                endpoint.limiter.acquire()
+            try:
+                response = endpoint.client.chat.completions.create(**dict(kwargs, model=endpoint.resolve(model)))
+            except Exception as e:
+                if classify_error(e) not in PROVIDER_FAILURES:
+                    self._release(endpoint, neutral=True)
+                    raise
+                self._release(endpoint, e)
+                last_error = e
+                endpoint.stats["failovers"] += 1
+                continue
+            if kwargs.get("stream"):
+                return self._stream(endpoint, response)
+            self._release(endpoint)
+            return response
+
+    def _stream(self, endpoint, stream):
+        """流式响应读取完毕或关闭时才释放在途计数"""
+        error = None
+        try:
+            yield from stream
+        except Exception as e:
+            error = e
+            raise
+        finally:
+            close = getattr(stream, "close", None)
+            if close is not None:
+                close()
+            if error is None:
+                self._release(endpoint)
+            elif classify_error(error) in PROVIDER_FAILURES:
+                self._release(endpoint, error)
+            else:
+                self._release(endpoint, neutral=True)
+
+    def describe(self):
+        now = time.monotonic()
+        return "\n".join(
+            f"端点 {e.name}: 请求 {e.stats['requests']} | 错误 {e.stats['errors']} | "
+            f"切换 {e.stats['failovers']} | {'可用' if e.healthy(now) else '暂停中'}"
+            for e in self.endpoints
+        )
+
+
+def load_client_pool(path, strategy="least_loaded"):
+    """从 JSON 端点配置文件构建客户端池"""
+    with open(path, 'r', encoding='utf-8') as f:
+        return ClientPool.from_config(json.load(f), strategy)
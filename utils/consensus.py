@@ -0,0 +1,271 @@
+# -*- coding: utf-8 -*-
+"""
+多模型结果一致性合并（按DOI对齐、流式处理）
+
+任意数量的模型输出CSV按规范化DOI对齐，逐字段加权投票，平票时按 priority_map
+指定的模型取值。各文件同步逐行读取：某DOI收齐全部模型结果后立即输出并释放，
+文件顺序大致一致时内存占用与文件长度无关；未收齐的（某模型漏抽）在末尾按已有票数输出。
+投票前按字段规范化取值（活性物种、单位换算、无序元素列表等），等价写法归为同一组。
+"""
+import csv
+import logging
+import re
+from contextlib import ExitStack
+from functools import lru_cache
+from itertools import zip_longest
+
+from utils.quantities import parse_quantities
+from utils.records import flatten_value, is_null_value, split_list_value
+
+DOI_PREFIX = re.compile(r'^(https?://(dx\.)?doi\.org/|doi\s*:?\s*)', re.IGNORECASE)
+
+
+def normalize_doi(value):
+    doi = DOI_PREFIX.sub('', (value or '').strip())
+    return doi.strip().rstrip('.,;').lower()
+
+
+def normalize_value(value):
+    """默认分组规则：折叠空白后完全一致"""
+    return re.sub(r'\s+', ' ', value.strip())
+
+
+# 活性物种/EPR信号别名（已去除非字母数字字符并转大写）
+SPECIES_ALIASES = {
+    'HO': 'OH', 'HYDROXYL': 'OH', 'HYDROXYLRADICAL': 'OH', 'OHRADICAL': 'OH',
+    'SO4RADICAL': 'SO4', 'SULFATE': 'SO4', 'SULFATERADICAL': 'SO4', 'SULPHATERADICAL': 'SO4',
+    'SUPEROXIDE': 'O2', 'SUPEROXIDERADICAL': 'O2', 'O2RADICAL': 'O2',
+    'SINGLETOXYGEN': '1O2', 'SINGLETO2': '1O2',
+    'DMPOHO': 'DMPOOH', 'DMPOSO4': 'DMPOSO4', 'DMPOO2': 'DMPOO2', 'TEMPO': 'TEMP1O2',
+    'ETRANSFER': 'ETP', 'ELECTRONTRANSFER': 'ETP', 'ELECTRONTRANSFERPROCESS': 'ETP',
+}
+# 猝灭剂别名（小写、去除非字母数字字符）
+QUENCHER_ALIASES = {
+    'methanol': 'meoh', 'ethanol': 'etoh',
+    'tertbutanol': 'tba', 'tertbutylalcohol': 'tba', 'tbutanol': 'tba',
+    'pbenzoquinone': 'pbq', 'benzoquinone': 'pbq', 'bq': 'pbq',
+    'furfurylalcohol': 'ffa', 'lhistidine': 'lhis', 'histidine': 'lhis',
+    'dimethylsulfoxide': 'dmso', 'potassiumdichromate': 'k2cr2o7',
+}
+
+
+def _unordered(items):
+    return '|'.join(sorted(set(item for item in items if item)))
+
+
+def canonical_species(value):
+    """活性物种/EPR信号：忽略符号（·、−、?等）与顺序"""
+    items = []
+    for item in split_list_value(value):
+        key = re.sub(r'[^a-zA-Z0-9]', '', item).upper()
+        items.append(SPECIES_ALIASES.get(key, key))
+    return _unordered(items)
+
+
+def canonical_quencher(value):
+    items = []
+    for item in split_list_value(value):
+        key = re.sub(r'[^a-z0-9]', '', item.lower())
+        items.append(QUENCHER_ALIASES.get(key, key))
+    return _unordered(items)
+
+
+def canonical_elements(value):
+    """元素列表：忽略顺序与大小写（Fe, co → Co|Fe）"""
+    return _unordered(re.sub(r'[^a-zA-Z]', '', item).capitalize() for item in split_list_value(value))
+
+
+def canonical_names(value):
+    """名称列表（污染物等）：忽略顺序、大小写、空格与连字符"""
+    return _unordered(re.sub(r'[\s\-‐–]', '', item.lower()) for item in split_list_value(value))
+
+
+def canonical_quantity(value):
+    """带单位数值：换算到统一单位后按4位有效数字比较；无法解析时退回默认规则"""
+    quantities = parse_quantities(value)
+    if not quantities:
+        return normalize_value(value)
+    parts = []
+    for q in quantities:
+        numbers = '~'.join(f'{v:.4g}' for v in q.values)
+        parts.append(f'{q.label or ""}:{numbers}:{q.dimension or ""}')
+    return ';'.join(parts)
+
+
+FIELD_CANONICALIZERS = {
+    'ORS': canonical_species,
+    'EPR_signals': canonical_species,
+    'quencher': canonical_quencher,
+    'SA_element': canonical_elements,
+    'co_elements': canonical_elements,
+    'pollutants': canonical_names,
+    'pilot_pollutant': canonical_names,
+    'dose_catalyst': canonical_quantity,
+    'dose_oxidant': canonical_quantity,
+    'pH': canonical_quantity,
+    'catalyst_cycles': canonical_quantity,
+    'pollutant_constant': canonical_quantity,
+    'pilot_time': canonical_quantity,
+    'DOI': normalize_doi,
+}
+
+
+@lru_cache(maxsize=65536)
+def canonicalize_field(field, value):
+    """
+    字段取值的分组键。空值的各种写法（null、N/A、not mentioned…）归为同一组；
+    按 (字段, 取值) 缓存，重复取值只规范化一次。
+    """
+    if is_null_value(value):
+        return None
+    canonicalizer = FIELD_CANONICALIZERS.get(field, normalize_value)
+    try:
+        return canonicalizer(value) or normalize_value(value)
+    except (ValueError, OverflowError):
+        return normalize_value(value)
+
+
+def iter_csv_rows(path, reader):
+    """逐行读取（单次遍历完成编码校验）"""
+    try:
+        for row in reader:
+            yield {
+                k: str(v).replace('\ufeff', '').strip() if v is not None else ''
+                for k, v in row.items() if k is not None
+            }
+    except UnicodeDecodeError as e:
+        raise ValueError(f"文件编码不兼容: {path} - {str(e)}") from e
+
+
+class ConsensusEngine:
+    def __init__(self, fieldnames, n_models, priority_map=None, weights=None,
+                 doi_field='DOI', canonicalize=None):
+        self.fieldnames = fieldnames
+        self.n_models = n_models
+        self.priority_map = priority_map or {}
+        self.weights = weights or [1.0] * n_models
+        self.doi_field = doi_field
+        # canonicalize(field, value) -> 分组键
+        self.canonicalize = canonicalize or canonicalize_field
+        self.pending = {}  # 对齐键 -> [各模型的行或None]
+        self.positions = [0] * n_models
+        self._needs_review = False
+        self.stats = {"rows": 0, "incomplete": 0, "unanimous_fields": 0, "voted_fields": 0, "tie_fields": 0,
+                      "review_rows": 0}
+
+    def key_of(self, model_idx, row):
+        doi = normalize_doi(row.get(self.doi_field, ''))
+        if doi:
+            return doi
+        return ("row", self.positions[model_idx])  # 无DOI时退回按行号对齐
+
+    def add(self, model_idx, row):
+        """加入一行，某键收齐全部模型时返回合并结果，否则返回 None"""
+        key = self.key_of(model_idx, row)
+        self.positions[model_idx] += 1
+        slots = self.pending.setdefault(key, [None] * self.n_models)
+        if slots[model_idx] is not None:
+            logging.warning(f"模型 {model_idx} 中重复的DOI: {key}，保留首次出现的记录")
+            return None
+        slots[model_idx] = row
+        if all(slot is not None for slot in slots):
+            del self.pending[key]
+            return self.merge(slots)
+        return None
+
+    def flush(self):
+        """输出未收齐全部模型的记录"""
+        for key, slots in list(self.pending.items()):
+            missing = [i for i, slot in enumerate(slots) if slot is None]
+            logging.info(f"{key} 缺少模型 {missing} 的结果，按已有结果投票")
+            yield self.merge(slots)
+        self.pending.clear()
+
+    def vote(self, field, values):
+        """
+        加权投票：返回得票最高组的代表值；平票时优先 priority_map 指定模型所在组。
+        values 中 None 表示该模型缺少此篇结果；空值及 null/N/A 等写法不计票，
+        只有全部模型均为空时结果才为空。
+
+        >>> engine = ConsensusEngine(["catalyst_cycles", "pH"], 3, priority_map={"pH": 2})
+        >>> engine.merge([{"catalyst_cycles": "5", "pH": ""}, {"catalyst_cycles": "", "pH": "null"},
+        ...               {"catalyst_cycles": "", "pH": "7"}])
+        {'catalyst_cycles': '5', 'pH': '7'}
+        >>> engine.merge([{"catalyst_cycles": "", "pH": "N/A"}, None, {"catalyst_cycles": "null", "pH": ""}])
+        {'catalyst_cycles': '', 'pH': ''}
+        """
+        groups = {}
+        for model_idx, value in enumerate(values):
+            if value is None:
+                continue
+            key = self.canonicalize(field, value)
+            if key is None:
+                continue
+            group = groups.setdefault(key, {"weight": 0.0, "members": []})
+            group["weight"] += self.weights[model_idx]
+            group["members"].append(model_idx)
+        if not groups:
+            return ''
+
+        preferred = self.priority_map.get(field, 0)
+        best = max(group["weight"] for group in groups.values())
+        winners = [group for group in groups.values() if group["weight"] == best]
+        if len(groups) == 1:
+            self.stats["unanimous_fields"] += 1
+        elif len(winners) > 1:
+            self.stats["tie_fields"] += 1
+            self._needs_review = True
+        else:
+            self.stats["voted_fields"] += 1
+
+        winner = next((group for group in winners if preferred in group["members"]), winners[0])
+        representative = preferred if preferred in winner["members"] else winner["members"][0]
+        return values[representative]
+
+    @staticmethod
+    def _cell(value):
+        value = flatten_value(value)
+        return '' if value is None else str(value)
+
+    def merge(self, slots):
+        """合并同一篇文献的各模型结果；slots 中 None 表示该模型无结果（计入 incomplete）"""
+        self.stats["rows"] += 1
+        if any(slot is None for slot in slots):
+            self.stats["incomplete"] += 1
+        self._needs_review = False
+        merged = {}
+        for field in self.fieldnames:
+            values = [self._cell(slot.get(field)) if slot is not None else None for slot in slots]
+            merged[field] = self.vote(field, values)
+        if self._needs_review:
+            self.stats["review_rows"] += 1
+        return merged
+
+
+def run_consensus(paths, output_path, priority_map=None, weights=None, canonicalize=None):
+    """同步流式读取所有输入并写出一致性结果，返回统计信息"""
+    with ExitStack() as stack:
+        readers = []
+        for path in paths:
+            f = stack.enter_context(open(path, 'r', encoding='utf-8-sig', newline=''))
+            readers.append(csv.DictReader(f))
+        fieldnames = [name.replace('\ufeff', '') for name in (readers[0].fieldnames or [])]
+        if not fieldnames:
+            raise ValueError(f"输入文件缺少表头: {paths[0]}")
+
+        engine = ConsensusEngine(fieldnames, len(paths), priority_map, weights, canonicalize=canonicalize)
+        streams = [iter_csv_rows(path, reader) for path, reader in zip(paths, readers)]
+
+        out = stack.enter_context(open(output_path, 'w', newline='', encoding='utf-8-sig'))
+        writer = csv.DictWriter(out, fieldnames=fieldnames)
+        writer.writeheader()
+        for rows in zip_longest(*streams):
+            for model_idx, row in enumerate(rows):
+                if row is None:
+                    continue
+                merged = engine.add(model_idx, row)
+                if merged is not None:
+                    writer.writerow(merged)
+        for merged in engine.flush():
+            writer.writerow(merged)
+    return engine.stats
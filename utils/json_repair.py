@@ -0,0 +1,149 @@
+# -*- coding: utf-8 -*-
+"""
+模型输出JSON的容错解析与按字段校验
+
+依次尝试：原样解析 → 去除推理段/代码块/前言 → 弯引号与尾随逗号修复 →
+补全截断的字符串与括号 → 按Python字面量解析（单引号对象）。只在字符串外修改，
+不会破坏 3'-hydroxy 这类含撇号的取值。
+"""
+import ast
+import json
+import re
+
+from utils.json_stream import JSONObjectScanner, MalformedStreamError
+from utils.records import flatten_value
+
+THINK_BLOCK = re.compile(r'<think>.*?(?:</think>|$)', re.DOTALL)
+
+
+def _extract_object(text):
+    """取出首个顶层对象；被截断时补全未闭合的字符串与括号"""
+    text = THINK_BLOCK.sub('', text)
+    start = text.find('{')
+    if start < 0:
+        raise ValueError("未找到JSON对象")
+    scanner = JSONObjectScanner(max_preamble_chars=len(text))
+    try:
+        scanner.feed(text[start:])
+    except MalformedStreamError:
+        return text[start:text.rfind('}') + 1] or text[start:]
+    body = scanner.text()
+    if scanner.complete:
+        return body
+    # 截断：闭合字符串，去掉悬空的逗号/冒号（最内层为对象时连同悬空的键），再按括号栈补齐
+    if scanner.in_string:
+        body += '"'
+    if scanner.stack[-1] == '{':
+        body = re.sub(r'(,\s*"[^"]*"\s*:?\s*|[,:]\s*)$', '', body.rstrip())
+    else:
+        body = re.sub(r',\s*$', '', body.rstrip())
+    closers = {'{': '}', '[': ']'}
+    return body + ''.join(closers[ch] for ch in reversed(scanner.stack))
+
+
+def _outside_strings(text, quotes='"'):
+    """逐段产出 (是否在字符串内, 片段)；quotes 为可作字符串定界符的字符"""
+    start, opener, escape = 0, None, False
+    for i, ch in enumerate(text):
+        if opener:
+            if escape:
+                escape = False
+            elif ch == '\\':
+                escape = True
+            elif ch == opener:
+                opener = None
+                yield True, text[start:i + 1]
+                start = i + 1
+        elif ch in quotes:
+            if start < i:
+                yield False, text[start:i]
+            start, opener = i, ch
+    if start < len(text):
+        yield opener is not None, text[start:]
+
+
+def _fix_structure(text, quotes='"'):
+    """字符串外去除尾随逗号"""
+    pieces = []
+    for in_string, piece in _outside_strings(text, quotes):
+        if not in_string:
+            piece = re.sub(r',(\s*[}\]])', r'\1', piece)
+        pieces.append(piece)
+    return ''.join(pieces)
+
+
+def _normalize_smart_quotes(text):
+    # 整体使用弯引号作定界符时才替换，避免改动取值中的引号
+    if '"' in text and not re.search(r'[“”„]\s*:', text):
+        return text
+    return re.sub(r'[“”„]', '"', text)
+
+
+def loads_tolerant(text):
+    """
+    解析模型输出中的JSON对象；无法修复时抛出 ValueError
+
+    >>> loads_tolerant('{"a": "x", "b": ["p", "q"')
+    {'a': 'x', 'b': ['p', 'q']}
+    >>> loads_tolerant('{"a": "x", "b": ["p", "q"], "c"')
+    {'a': 'x', 'b': ['p', 'q']}
+    """
+    if not text or not text.strip():
+        raise ValueError("Empty JSON content")
+    try:
+        return json.loads(text, strict=False)
+    except ValueError:
+        pass
+
+    candidate = _fix_structure(_normalize_smart_quotes(_extract_object(text)))
+    try:
+        return json.loads(candidate, strict=False)
+    except ValueError as e:
+        error = e
+
+    # 单引号对象（Python 字典风格）
+    literal = _fix_structure(candidate, quotes='"\'')
+    pieces = []
+    for in_string, piece in _outside_strings(literal, quotes='"\''):
+        if not in_string:
+            piece = re.sub(r'\bnull\b', 'None', piece)
+            piece = re.sub(r'\btrue\b', 'True', piece)
+            piece = re.sub(r'\bfalse\b', 'False', piece)
+        pieces.append(piece)
+    try:
+        data = ast.literal_eval(''.join(pieces))
+    except (ValueError, SyntaxError, MemoryError, RecursionError):
+        raise ValueError(f"JSON修复失败: {error}") from error
+    if not isinstance(data, (dict, list)):
+        raise ValueError("解析结果不是JSON对象")
+    return data
+
+
+def coerce_record(data, columns):
+    """
+    按字段清单校验并整理：外层为单元素列表或单键包装对象时解包，列表取值用逗号连接，
+    缺失字段记为 None。返回 (记录, 缺失字段列表)；一个字段都没有时抛出 ValueError。
+    """
+    if isinstance(data, list) and len(data) == 1:
+        data = data[0]
+    if isinstance(data, dict) and len(data) == 1:
+        inner = next(iter(data.values()))
+        if isinstance(inner, dict) and not set(data) & set(columns):
+            data = inner
+    if not isinstance(data, dict):
+        raise ValueError(f"期望JSON对象，实际为 {type(data).__name__}")
+
+    lowered = {str(k).strip().lower(): v for k, v in data.items()}
+    record, missing = {}, []
+    for col in columns:
+        if col in data:
+            value = data[col]
+        elif col.lower() in lowered:
+            value = lowered[col.lower()]
+        else:
+            missing.append(col)
+            value = None
+        record[col] = flatten_value(value)
+    if len(missing) == len(columns):
+        raise ValueError("响应中没有任何所需字段")
+    return record, missing
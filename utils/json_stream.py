@@ -0,0 +1,123 @@
+# -*- coding: utf-8 -*-
+"""
+流式响应中的JSON对象增量识别
+
+逐段读入模型输出，跟踪字符串/转义与括号栈：顶层对象闭合后不再解析内容；
+对象前的非JSON前言过长或括号不匹配时抛出 MalformedStreamError，以便提前中止并重试。
+"""
+from utils.retry import RetryableOutputError
+
+
+class MalformedStreamError(RetryableOutputError):
+    """流式输出明显不是所需的JSON对象"""
+
+
+class JSONObjectScanner:
+    CLOSERS = {'}': '{', ']': '['}
+
+    def __init__(self, max_preamble_chars=2000):
+        self.max_preamble_chars = max_preamble_chars
+        self.preamble = []
+        self.preamble_chars = 0
+        self.in_think = False
+        self.parts = []
+        self.stack = []
+        self.in_string = False
+        self.escape = False
+        self.complete = False
+
+    @property
+    def started(self):
+        return bool(self.stack) or self.complete
+
+    def feed(self, piece):
+        """
+        读入一段文本；对象闭合后忽略后续内容。<think> 推理段中的括号不视为对象开始。
+
+        >>> scanner = JSONObjectScanner()
+        >>> scanner.feed('<think>输出格式形如 {"pH": ...}</think> {"pH": "7"')
+        >>> scanner.feed('}')
+        >>> scanner.complete, scanner.text()
+        (True, '{"pH": "7"}')
+        """
+        for ch in piece:
+            if self.complete:
+                return
+            if not self.stack:
+                if ch == '{' and not self.in_think:
+                    self.stack.append(ch)
+                    self.parts.append(ch)
+                else:
+                    self._preamble(ch)
+                continue
+
+            self.parts.append(ch)
+            if self.in_string:
+                if self.escape:
+                    self.escape = False
+                elif ch == '\\':
+                    self.escape = True
+                elif ch == '"':
+                    self.in_string = False
+            elif ch == '"':
+                self.in_string = True
+            elif ch in '{[':
+                self.stack.append(ch)
+            elif ch in self.CLOSERS:
+                if self.stack[-1] != self.CLOSERS[ch]:
+                    raise MalformedStreamError(f"括号不匹配: {''.join(self.parts)[-80:]}")
+                self.stack.pop()
+                if not self.stack:
+                    self.complete = True
+
+    def _preamble(self, ch):
+        # 代码块标记与 <think>…</think> 推理段不计入前言长度
+        self.preamble.append(ch)
+        tail = ''.join(self.preamble[-8:])
+        if tail.endswith('<think>'):
+            self.in_think = True
+        elif tail.endswith('</think>'):
+            self.in_think = False
+        elif not self.in_think and not ch.isspace() and ch != '`':
+            self.preamble_chars += 1
+            if self.preamble_chars > self.max_preamble_chars:
+                raise MalformedStreamError(f"超过 {self.max_preamble_chars} 字符仍未出现JSON对象")
+
+    def text(self):
+        """已读到的对象文本；对象未开始时返回前言原文"""
+        if self.parts:
+            return ''.join(self.parts)
+        return ''.join(self.preamble)
+
+
+def read_json_stream(stream, max_preamble_chars=2000):
+    """
+    读取 chat.completions 流。顶层JSON对象闭合后继续读到末尾的 usage 块
+    （需请求 stream_options={"include_usage": True}），对象后的多余输出超过
+    max_preamble_chars 时提前关闭连接，此时 usage 为空。
+    返回 (对象文本, usage, 是否提前停止)；格式异常时抛出 MalformedStreamError。
+    """
+    scanner = JSONObjectScanner(max_preamble_chars)
+    usage = None
+    stopped_early = False
+    trailing_chars = 0
+    try:
+        for chunk in stream:
+            usage = getattr(chunk, "usage", None) or usage
+            if not chunk.choices:
+                continue
+            piece = getattr(chunk.choices[0].delta, "content", None)
+            if not piece:
+                continue
+            if scanner.complete:
+                trailing_chars += len(piece)
+                if trailing_chars > max_preamble_chars:
+                    stopped_early = True
+                    break
+                continue
+            scanner.feed(piece)
+    finally:
+        close = getattr(stream, "close", None)
+        if close is not None:
+            close()
+    return scanner.text(), usage, stopped_early
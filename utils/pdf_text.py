@@ -0,0 +1,230 @@
+# -*- coding: utf-8 -*-
+"""
+PDF文本提取与本地缓存
+
+缓存按 (PDF文件SHA-256, 提取器版本) 存放逐页原始文本（gzip压缩的JSON），
+修改提取逻辑时请同步提升 EXTRACTOR_VERSION。
+"""
+import gzip
+import hashlib
+import json
+import os
+import re
+from collections import Counter
+
+import fitz
+
+EXTRACTOR_VERSION = "1"
+
+LINE_NUMBER = re.compile(r'^\d{1,4}$')
+DOI_PATTERN = re.compile(r'\b10\.\d{4,9}/\S+')  # 含DOI的页眉页脚不删除（DOI为必填字段）
+MARGIN_LINES = 3  # 页眉页脚只在每页首尾若干行中查找
+REFERENCE_HEADING = re.compile(
+    r'^(references?|bibliography|literature cited|notes and references|references and notes)\s*:?$',
+    re.IGNORECASE
+)
+
+
+def file_sha256(path, chunk_size=1 << 20):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def iter_pages(pdf_path):
+    """逐页产出原始文本（生成器，不在内存中拼接全文）"""
+    with fitz.open(pdf_path) as doc:
+        for page in doc:
+            yield page.get_text()
+
+
+def extract_pages(pdf_path):
+    return list(iter_pages(pdf_path))
+
+
+class TextCache:
+    def __init__(self, cache_dir, version=EXTRACTOR_VERSION):
+        self.cache_dir = os.path.abspath(cache_dir)
+        self.version = version
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    def _path(self, sha):
+        return os.path.join(self.cache_dir, sha[:2], f"{sha}-v{self.version}.json.gz")
+
+    def get(self, sha):
+        path = self._path(sha)
+        if not os.path.exists(path):
+            self.misses += 1
+            return None
+        try:
+            with gzip.open(path, 'rt', encoding='utf-8') as f:
+                pages = json.load(f)
+        except (OSError, ValueError):
+            # 损坏的缓存文件视为未命中
+            self.misses += 1
+            return None
+        self.hits += 1
+        return pages
+
+    def put(self, sha, pages):
+        path = self._path(sha)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with gzip.open(tmp_path, 'wt', encoding='utf-8') as f:
+            json.dump(pages, f, ensure_ascii=False)
+        os.replace(tmp_path, path)  # 原子替换，避免并发写出半个文件
+
+
+def load_pages(pdf_path, cache=None):
+    """优先读缓存，未命中时调用 fitz 提取并写回缓存"""
+    if cache is None:
+        return extract_pages(pdf_path)
+    sha = file_sha256(pdf_path)
+    pages = cache.get(sha)
+    if pages is None:
+        pages = extract_pages(pdf_path)
+        cache.put(sha, pages)
+    return pages
+
+
+def pages_to_text(pages):
+    """逐页文本拼接为送入模型的全文（页内换行替换为空格，页间保留换行）"""
+    return "".join(text.replace('\n', ' ') + "\n" for text in pages)
+
+
+def _line_key(line):
+    """页眉页脚比对用的归一化形式（数字统一，忽略页码变化）"""
+    return re.sub(r'\d+', '#', line.strip().lower())
+
+
+def _margin_indices(lines):
+    """每页首尾 MARGIN_LINES 个非空行的行号"""
+    filled = [i for i, line in enumerate(lines) if line.strip()]
+    return set(filled[:MARGIN_LINES] + filled[-MARGIN_LINES:])
+
+
+def _page_number_lines(page_lines, margins):
+    """
+    页码行：位于页首/页尾、仅含数字，且与其他页同位置的数字按页序递增（差值等于页号差）。
+    正文中的孤立整数（表格数值、循环次数、pH 等）不受影响。
+    """
+    candidates = [
+        {l_idx: int(lines[l_idx].strip()) for l_idx in margin if LINE_NUMBER.match(lines[l_idx].strip())}
+        for lines, margin in zip(page_lines, margins)
+    ]
+    found = set()
+    for p_idx, numbers in enumerate(candidates):
+        for l_idx, value in numbers.items():
+            for q_idx in (p_idx - 1, p_idx + 1):
+                if 0 <= q_idx < len(candidates) and value + (q_idx - p_idx) in candidates[q_idx].values():
+                    found.add((p_idx, l_idx))
+                    break
+    return found
+
+
+def _find_references(page_lines):
+    """定位参考文献标题（仅在全文40%之后出现的第一个），返回 (页号, 行号)"""
+    total = sum(len(line) for lines in page_lines for line in lines)
+    position = 0
+    for p_idx, lines in enumerate(page_lines):
+        for l_idx, line in enumerate(lines):
+            if position >= 0.4 * total and REFERENCE_HEADING.match(line.strip()):
+                return p_idx, l_idx
+            position += len(line)
+    return None
+
+
+def _join_lines(lines):
+    """页内各行以空格拼接，行尾连字符断词直接拼回"""
+    text = ""
+    for line in lines:
+        if text.endswith('-') and line[:1].islower():
+            text = text[:-1] + line
+        else:
+            text = f"{text} {line}" if text else line
+    return text
+
+
+def iter_clean_pages(pages, stats=None):
+    """
+    逐页产出清理后的文本：去除页首/页尾跨页重复的页眉页脚与递增的页码，截去参考文献及之后内容。
+    含DOI的行始终保留。stats 字典累计 boilerplate_chars / reference_chars。
+    """
+    if stats is None:
+        stats = {}
+    stats.setdefault("boilerplate_chars", 0)
+    stats.setdefault("reference_chars", 0)
+    page_lines = [page.splitlines() for page in pages]
+    margins = [_margin_indices(lines) for lines in page_lines]
+
+    repeated = set()
+    if len(page_lines) >= 3:
+        counts = Counter()
+        for lines, margin in zip(page_lines, margins):
+            counts.update({
+                _line_key(lines[i]) for i in margin
+                if len(lines[i].strip()) <= 120 and not LINE_NUMBER.match(lines[i].strip())
+            })
+        threshold = max(3, len(page_lines) // 2)
+        repeated = {key for key, n in counts.items() if n >= threshold}
+
+    page_numbers = _page_number_lines(page_lines, margins)
+    cut = _find_references(page_lines)
+    for p_idx, lines in enumerate(page_lines):
+        kept = []
+        for l_idx, line in enumerate(lines):
+            stripped = line.strip()
+            if cut is not None and (p_idx, l_idx) >= cut:
+                stats["reference_chars"] += len(stripped)
+            elif not stripped:
+                continue
+            elif DOI_PATTERN.search(stripped):
+                kept.append(stripped)
+            elif (p_idx, l_idx) in page_numbers or (l_idx in margins[p_idx] and _line_key(stripped) in repeated):
+                stats["boilerplate_chars"] += len(stripped)
+            else:
+                kept.append(stripped)
+        if cut is not None and p_idx > cut[0]:
+            continue
+        yield _join_lines(kept)
+
+
+def clean_text(pages):
+    """
+    返回 (清理后的全文, 删除统计)
+
+    >>> pages = [f"J. Catal. 2024 doi: 10.1016/j.x.1\\n{m}-N-C at pH\\n7\\n{i + 1}" for i, m in enumerate("Fe Co Cu Mn".split())]
+    >>> clean_text(pages)[0].splitlines()[0]
+    'J. Catal. 2024 doi: 10.1016/j.x.1 Fe-N-C at pH 7'
+    """
+    stats = {"raw_chars": sum(len(page) for page in pages)}
+    text = "".join(page + "\n" for page in iter_clean_pages(pages, stats))
+    stats["kept_chars"] = len(text)
+    return text, stats
+
+
+def describe_cleanup(stats):
+    return (
+        f"文本清理: 原始 {stats['raw_chars']} 字符 → 保留 {stats['kept_chars']} 字符"
+        f"（页眉页脚/行号 {stats['boilerplate_chars']}，参考文献 {stats['reference_chars']}）"
+    )
+
+
+def extract_text_worker(pdf_path, cache_dir=None, strip_boilerplate=False):
+    """
+    供进程池调用的提取函数（顶层函数，可被pickle）。
+    返回 (文本, 是否命中缓存)；未启用缓存时命中标记为 None。
+    工作进程各自构造 TextCache，命中计数需由调用方按返回值累加。
+    """
+    cache = TextCache(cache_dir) if cache_dir else None
+    pages = load_pages(pdf_path, cache)
+    cache_hit = cache.hits > 0 if cache is not None else None
+    if not strip_boilerplate:
+        return pages_to_text(pages), cache_hit
+    text, stats = clean_text(pages)
+    print(f"{os.path.basename(pdf_path)} {describe_cleanup(stats)}")
+    return text, cache_hit
@@ -0,0 +1,151 @@
+# -*- coding: utf-8 -*-
+"""
+带单位数值的解析与比较
+
+支持质量浓度（→mg/L）、摩尔浓度（→mM）、速率常数（→min-1）、质量（→mg）、
+时间（→min）、pH 区间及无量纲计数；换算到统一单位后本地判定是否一致，
+无法解析或量纲不可比时返回 None，交由模型评分。
+"""
+import math
+import re
+from collections import namedtuple
+
+from utils.records import split_list_value
+
+Quantity = namedtuple("Quantity", ["values", "dimension", "label"])
+
+NUMBER = r'\d+(?:\.\d+)?(?:\s*[×x*]\s*10\s*\^?\s*[-−]?\s*\d+|[eE][-−+]?\d+)?'
+QUANTITY = re.compile(
+    rf'(?P<num>{NUMBER})(?:\s*(?:-|–|—|~|to)\s*(?P<num2>{NUMBER}))?'
+    r'\s*(?P<unit>[a-zA-Zµμ%/](?:[a-zA-Zµμ/·.\s]|\^?\s*[-−⁻]\s*[1¹])*)?'
+)
+
+# 区分大小写的单位（摩尔浓度 M 与前缀 m 不能混淆）
+CASE_SENSITIVE_UNITS = {
+    'M': ('molar', 1000), 'mM': ('molar', 1), 'uM': ('molar', 1e-3), 'nM': ('molar', 1e-6),
+}
+# 其余单位按小写匹配：(量纲, 换算到统一单位的系数)
+UNITS = {
+    # 质量浓度 → mg/L
+    'g/l': ('mass_conc', 1000), 'gl-1': ('mass_conc', 1000),
+    'mg/l': ('mass_conc', 1), 'mgl-1': ('mass_conc', 1), 'ppm': ('mass_conc', 1),
+    'ug/l': ('mass_conc', 1e-3), 'ugl-1': ('mass_conc', 1e-3), 'ppb': ('mass_conc', 1e-3),
+    'ng/l': ('mass_conc', 1e-6), 'mg/ml': ('mass_conc', 1000), 'mgml-1': ('mass_conc', 1000),
+    # 摩尔浓度 → mM
+    'mol/l': ('molar', 1000), 'moll-1': ('molar', 1000),
+    'mmol/l': ('molar', 1), 'mmoll-1': ('molar', 1),
+    'umol/l': ('molar', 1e-3), 'umoll-1': ('molar', 1e-3),
+    # 速率常数 → min-1
+    'min-1': ('rate', 1), '/min': ('rate', 1),
+    's-1': ('rate', 60), 'sec-1': ('rate', 60), '/s': ('rate', 60),
+    'h-1': ('rate', 1 / 60), 'hr-1': ('rate', 1 / 60), '/h': ('rate', 1 / 60),
+    # 质量 → mg
+    'kg': ('mass', 1e6), 'g': ('mass', 1000), 'mg': ('mass', 1), 'ug': ('mass', 1e-3),
+    # 时间 → min
+    'min': ('time', 1), 'mins': ('time', 1), 'minutes': ('time', 1),
+    'h': ('time', 60), 'hr': ('time', 60), 'hrs': ('time', 60), 'hour': ('time', 60), 'hours': ('time', 60),
+    'd': ('time', 1440), 'day': ('time', 1440), 'days': ('time', 1440),
+    's': ('time', 1 / 60), 'sec': ('time', 1 / 60),
+    # 计数（与无单位数字等价）
+    'cycles': (None, 1), 'cycle': (None, 1), 'times': (None, 1), 'runs': (None, 1),
+    '%': ('percent', 1),
+}
+
+
+def _normalize_unit(unit):
+    unit = (
+        unit.replace('µ', 'u').replace('μ', 'u')
+            .replace('⁻¹', '-1').replace('−', '-').replace('^', '')
+    )
+    return re.sub(r'[\s·.]', '', unit)
+
+
+def _exact_unit(unit):
+    unit = _normalize_unit(unit)
+    if unit in CASE_SENSITIVE_UNITS:
+        return CASE_SENSITIVE_UNITS[unit]
+    return UNITS.get(unit.lower())
+
+
+def _lookup_unit(unit):
+    """
+    拆分为已知单位与其后的标签（如 "mg/L BPA" → mg/L + "BPA"），单位须在词边界处与已知单位完全一致。
+    返回 ((量纲, 系数), 标签)；无单位返回 ((None, 1), '')；未知单位返回 False
+    """
+    unit = (unit or '').strip()
+    if not unit:
+        return (None, 1), ''
+    for end in range(len(unit), 0, -1):
+        if end < len(unit) and not unit[end].isspace():
+            continue
+        known = _exact_unit(unit[:end])
+        if known is not None:
+            return known, unit[end:]
+    return False
+
+
+def _to_float(number):
+    number = number.replace('−', '-').replace(' ', '')
+    match = re.match(r'^(\d+(?:\.\d+)?)[×x*]10\^?(-?\d+)$', number)
+    if match:
+        return float(match.group(1)) * 10 ** int(match.group(2))
+    return float(number)
+
+
+def _label(text):
+    return re.sub(r'[^a-z0-9]', '', text.lower())
+
+
+def parse_quantities(text):
+    """解析为 Quantity 列表（按顶层逗号分项，括号内容作为标签）；无法解析返回 None"""
+    quantities = []
+    for item in split_list_value(text):
+        labels = re.findall(r'\(([^()]*)\)', item)
+        body = re.sub(r'\([^()]*\)', ' ', item)
+        matches = list(QUANTITY.finditer(body))
+        if not matches:
+            return None
+        paren_label = _label(labels[0]) if labels else ''
+        for match in matches:
+            unit = _lookup_unit(match.group('unit'))
+            if unit is False:
+                return None
+            (dimension, factor), trailing = unit
+            values = [_to_float(match.group('num'))]
+            if match.group('num2'):
+                values.append(_to_float(match.group('num2')))
+            label = _label(trailing) + paren_label or None
+            quantities.append(Quantity(tuple(v * factor for v in values), dimension, label))
+    return quantities or None
+
+
+def _same_values(a, b, rel_tol=0.005):
+    return len(a) == len(b) and all(
+        math.isclose(x, y, rel_tol=rel_tol, abs_tol=1e-12) for x, y in zip(a, b)
+    )
+
+
+def compare_quantity_text(text1, text2, penalty=30):
+    """
+    比较两段带单位数值文本：换算后全部一致 → 100，每个数值错误扣 penalty 分；
+    无法解析、项数不同、量纲不可比或标签（如污染物名）不同 → None。
+
+    >>> compare_quantity_text("0.5 mM PMS", "0.5 mM PDS"), compare_quantity_text("20 mg/L BPA", "20 mg/L phenol")
+    (None, None)
+    >>> compare_quantity_text("0.05 min-1 for BPA", "0.05 min-1 for phenol")
+    >>> compare_quantity_text("20 mg L-1 BPA", "0.02 g/L BPA"), compare_quantity_text("0.5 mM PMS", "0.6 mM PMS")
+    (100, 70)
+    >>> compare_quantity_text("10 gallons", "10 g")
+    """
+    q1, q2 = parse_quantities(text1), parse_quantities(text2)
+    if not q1 or not q2 or len(q1) != len(q2):
+        return None
+    errors = 0
+    for a, b in zip(q1, q2):
+        if a.dimension != b.dimension:
+            return None
+        if a.label and b.label and a.label != b.label:
+            return None
+        if not _same_values(a.values, b.values):
+            errors += 1
+    return max(0, 100 - penalty * errors)
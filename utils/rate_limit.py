@@ -0,0 +1,47 @@
+# -*- coding: utf-8 -*-
+"""
+令牌桶限流器
+
+同一模型的所有并发请求共享一个令牌桶，保证整体请求速率不超过服务商限额。
+"""
+import threading
+import time
+
+
+class TokenBucket:
+    def __init__(self, rate_per_minute, capacity=None):
+        self.rate = rate_per_minute / 60.0  # 每秒补充的令牌数
+        self.capacity = capacity or max(1, int(rate_per_minute // 6))  # 默认允许约10秒的突发量
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def acquire(self, tokens=1):
+        """阻塞直到取得令牌，返回等待时间（秒）"""
+        waited = 0.0
+        while True:
+            with self.lock:
+                self._refill()
+                if self.tokens >= tokens:
+                    self.tokens -= tokens
+                    return waited
+                delay = (tokens - self.tokens) / self.rate
+            time.sleep(delay)
+            waited += delay
+
+
+_buckets = {}
+_buckets_lock = threading.Lock()
+
+
+def get_rate_limiter(key, rate_per_minute, capacity=None):
+    """按模型名（或端点）返回进程内共享的令牌桶"""
+    with _buckets_lock:
+        if key not in _buckets:
+            _buckets[key] = TokenBucket(rate_per_minute, capacity)
+        return _buckets[key]
@@ -0,0 +1,65 @@
+# -*- coding: utf-8 -*-
+"""
+抽取记录（单行JSON）的通用处理：空值判定、列表型字段拆分与合并
+"""
+import json
+import re
+
+NULL_STRINGS = {'', 'null', 'none', 'nan', 'n/a', 'na', 'not mentioned', 'not reported'}
+
+
+def is_null_value(value):
+    if value is None:
+        return True
+    if isinstance(value, (list, tuple)):
+        return all(is_null_value(v) for v in value)
+    if isinstance(value, float) and value != value:  # NaN
+        return True
+    return str(value).strip().lower() in NULL_STRINGS
+
+
+def flatten_value(value):
+    """列表取值用逗号连接、对象取值序列化为JSON，其余原样返回"""
+    if isinstance(value, list):
+        items = [flatten_value(item) for item in value]
+        return ', '.join(str(item) for item in items if item is not None) or None
+    if isinstance(value, dict):
+        return json.dumps(value, ensure_ascii=False)
+    return value
+
+
+def split_list_value(value):
+    """按顶层逗号拆分（括号内的逗号不拆，如 "(1,10-phenanthroline)"）"""
+    if isinstance(value, (list, tuple)):
+        items = []
+        for v in value:
+            items.extend(split_list_value(v))
+        return items
+    items = []
+    depth = 0
+    current = ""
+    for char in str(value):
+        if char in '([{':
+            depth += 1
+        elif char in ')]}':
+            depth = max(0, depth - 1)
+        if char in ',;' and depth == 0:
+            items.append(current)
+            current = ""
+        else:
+            current += char
+    items.append(current)
+    return [item.strip() for item in items if not is_null_value(item)]
+
+
+def merge_list_values(values):
+    """多个列表型取值求并集（保持首次出现顺序，忽略大小写与空白差异）"""
+    merged = []
+    seen = set()
+    for value in values:
+        for item in split_list_value(value):
+            key = re.sub(r'\s+', '', item.lower())
+            if key not in seen:
+                seen.add(key)
+                merged.append(item)
+    return ", ".join(merged) if merged else None
@@ -0,0 +1,195 @@
+# -*- coding: utf-8 -*-
+"""
+统一重试策略
+
+按 openai 客户端的异常类型（缺失时退回字符串匹配）分类错误；优先遵循 Retry-After，
+否则用去相关抖动退避；每个条目有总时限。同一服务商共享一个熔断器：限流或连续故障时
+整个进程一起暂停到同一时刻，而不是各线程各自睡眠。
+"""
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+
+try:
+    import openai
+except ImportError:  # 仅用字符串匹配分类
+    openai = None
+
+RETRYABLE = {"RATE_LIMIT", "TIMEOUT", "CONNECTION_ERROR", "SERVER_ERROR", "MALFORMED_OUTPUT"}
+PROVIDER_FAILURES = {"RATE_LIMIT", "TIMEOUT", "CONNECTION_ERROR", "SERVER_ERROR"}
+
+
+class RetryableOutputError(ValueError):
+    """响应为空或无法解析，重新请求可能得到可用结果"""
+
+
+def classify_error(error):
+    if isinstance(error, RetryableOutputError):
+        return "MALFORMED_OUTPUT"
+    if openai is not None:
+        if isinstance(error, openai.RateLimitError):
+            return "RATE_LIMIT"
+        if isinstance(error, openai.APITimeoutError):
+            return "TIMEOUT"
+        if isinstance(error, openai.APIConnectionError):
+            return "CONNECTION_ERROR"
+        if isinstance(error, openai.InternalServerError):
+            return "SERVER_ERROR"
+        if isinstance(error, (openai.AuthenticationError, openai.PermissionDeniedError)):
+            return "AUTH_ERROR"
+        if isinstance(error, (openai.BadRequestError, openai.NotFoundError, openai.UnprocessableEntityError)):
+            return "INVALID_REQUEST"
+
+    status = getattr(error, "status_code", None)
+    if status in (408, 504):
+        return "TIMEOUT"
+    if status == 429:
+        return "RATE_LIMIT"
+    if status is not None and status >= 500:
+        return "SERVER_ERROR"
+
+    error_str = str(error).lower()
+    if "rate limit" in error_str or "429" in error_str:
+        return "RATE_LIMIT"
+    elif "timeout" in error_str or "timed out" in error_str:
+        return "TIMEOUT"
+    elif "connection" in error_str:
+        return "CONNECTION_ERROR"
+    elif "invalid request" in error_str:
+        return "INVALID_REQUEST"
+    return "UNKNOWN_ERROR"
+
+
+def retry_after(error):
+    """从响应头读取 Retry-After（秒或HTTP日期，也支持 retry-after-ms），没有时返回 None"""
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None)
+    if not headers:
+        return None
+    try:
+        if headers.get("retry-after-ms"):
+            return max(0.0, float(headers["retry-after-ms"]) / 1000)
+        value = headers.get("retry-after")
+        if not value:
+            return None
+        try:
+            return max(0.0, float(value))
+        except ValueError:
+            return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class CircuitBreaker:
+    """连续 failure_threshold 次服务商故障后暂停 cooldown 秒；限流时按 Retry-After 暂停"""
+    def __init__(self, failure_threshold=5, cooldown=30.0):
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.failures = 0
+        self.paused_until = 0.0
+        self.lock = threading.Lock()
+
+    def wait(self):
+        """暂停期间阻塞，返回等待时长"""
+        with self.lock:
+            delay = self.paused_until - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+            return delay
+        return 0.0
+
+    def pause(self, seconds):
+        with self.lock:
+            self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+    def record_success(self):
+        with self.lock:
+            self.failures = 0
+
+    def record_failure(self, category, wait_hint=None):
+        if category not in PROVIDER_FAILURES:
+            return
+        with self.lock:
+            self.failures += 1
+            tripped = self.failures >= self.failure_threshold
+            if tripped:
+                self.failures = 0
+        if tripped:
+            print(f"连续故障达到 {self.failure_threshold} 次，全部请求暂停 {self.cooldown:.0f} 秒")
+            self.pause(self.cooldown)
+        elif category == "RATE_LIMIT" and wait_hint:
+            self.pause(wait_hint)
+
+
+_breakers = {}
+_breakers_lock = threading.Lock()
+
+
+def get_circuit_breaker(key, failure_threshold=5, cooldown=30.0):
+    """按服务商（端点）返回进程内共享的熔断器"""
+    with _breakers_lock:
+        if key not in _breakers:
+            _breakers[key] = CircuitBreaker(failure_threshold, cooldown)
+        return _breakers[key]
+
+
+class RetryPolicy:
+    def __init__(self, max_attempts=4, base_delay=2.0, max_delay=120.0, deadline=900.0, breaker=None):
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.deadline = deadline  # 单个条目（含全部重试与等待）的总时限，秒
+        self.breaker = breaker
+
+    def next_delay(self, previous, category, error):
+        """
+        Retry-After 优先（按原值，仅受上限约束）；格式异常立即重试；其余为去相关抖动 min(上限, U(base, 3×上次))
+
+        >>> from types import SimpleNamespace
+        >>> error = SimpleNamespace(response=SimpleNamespace(headers={"retry-after": "0.2"}))
+        >>> RetryPolicy(base_delay=2.0).next_delay(2.0, "RATE_LIMIT", error)
+        0.2
+        """
+        hint = retry_after(error)
+        if hint is not None:
+            return min(self.max_delay, hint)
+        if category == "MALFORMED_OUTPUT":
+            return 0.0
+        return min(self.max_delay, random.uniform(self.base_delay, max(self.base_delay, previous * 3)))
+
+    def call(self, fn, on_error=None, label=""):
+        """
+        调用 fn(attempt)（attempt 从1开始）直至成功。on_error(category, error, attempt) 可调整下次请求，
+        返回 True/False 强制重试/放弃（强制重试不等待），返回 None 按默认规则。重试耗尽或超时后抛出最后一次的异常。
+        """
+        start = time.monotonic()
+        delay = self.base_delay
+        for attempt in range(1, self.max_attempts + 1):
+            if self.breaker is not None:
+                self.breaker.wait()
+            try:
+                result = fn(attempt)
+            except Exception as e:
+                category = classify_error(e)
+                print(f"{label} 尝试 {attempt}/{self.max_attempts} 失败 | 错误类型: {category}")
+                decision = on_error(category, e, attempt) if on_error is not None else None
+                retry = category in RETRYABLE if decision is None else decision
+                if self.breaker is not None:
+                    self.breaker.record_failure(category, retry_after(e))
+                if not retry or attempt == self.max_attempts:
+                    raise
+                if category in RETRYABLE:
+                    delay = self.next_delay(delay, category, e)
+                else:
+                    delay = 0.0  # on_error 已调整请求（如关闭JSON模式），立即重试
+                if time.monotonic() - start + delay > self.deadline:
+                    print(f"{label} 超出单条时限 {self.deadline:.0f} 秒，放弃重试")
+                    raise
+                if delay > 0:
+                    print(f"{label} {delay:.1f} 秒后重试")
+                    time.sleep(delay)
+            else:
+                if self.breaker is not None:
+                    self.breaker.record_success()
+                return result
@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+"""
+批处理运行清单（断点续跑）
+
+JSON Lines 追加写入，每条记录包含 PDF 哈希、状态、尝试次数及输出行；
+加载时以同一哈希的最后一条记录为准，崩溃时写了一半的末行会被忽略。
+"""
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from utils.pdf_text import file_sha256
+
+STATUS_SUCCESS = "success"
+STATUS_FAILED = "failed"
+
+
+class RunManifest:
+    def __init__(self, path):
+        self.path = path
+        self.entries = OrderedDict()  # sha256 -> 最新记录
+        self.hashes = {}  # pdf路径 -> sha256
+        self.lock = threading.Lock()
+        if os.path.exists(path):
+            self._load()
+
+    def _load(self):
+        with open(self.path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue  # 崩溃时未写完的行
+                self.entries[record["sha256"]] = record
+
+    def hash_of(self, pdf_path):
+        if pdf_path not in self.hashes:
+            self.hashes[pdf_path] = file_sha256(pdf_path)
+        return self.hashes[pdf_path]
+
+    def get(self, pdf_path):
+        return self.entries.get(self.hash_of(pdf_path))
+
+    def record(self, pdf_path, status, row=None):
+        sha = self.hash_of(pdf_path)
+        with self.lock:
+            previous = self.entries.get(sha)
+            record = {
+                "sha256": sha,
+                "file": os.path.basename(pdf_path),
+                "status": status,
+                "attempts": (previous["attempts"] if previous else 0) + 1,
+                "row": row,
+                "updated": time.time()
+            }
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(record, ensure_ascii=False, default=str) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+            self.entries[sha] = record
+        return record
+
+    def select(self, pdf_files, retry_failed_only=False):
+        """resume：返回未成功的PDF；retry_failed_only：仅返回记录为失败的PDF"""
+        selected = []
+        for pdf_path in pdf_files:
+            record = self.get(pdf_path)
+            if record is None:
+                if not retry_failed_only:
+                    selected.append(pdf_path)
+            elif record["status"] != STATUS_SUCCESS:
+                selected.append(pdf_path)
+        return selected
+
+    def succeeded_rows(self):
+        return [
+            record["row"] for record in self.entries.values()
+            if record["status"] == STATUS_SUCCESS and record["row"] is not None
+        ]
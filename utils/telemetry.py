@@ -0,0 +1,168 @@
+# -*- coding: utf-8 -*-
+"""
+LLM调用遥测
+
+每次 chat.completions 调用写一行 JSONL：调用方、模型、条目、提示/补全 token、
+耗时、第几次尝试、异常类型。汇总：
+
+    python -m utils.telemetry summary telemetry/calls.jsonl
+"""
+import argparse
+import json
+import math
+import os
+import threading
+import time
+from collections import defaultdict
+
+
+class Telemetry:
+    def __init__(self, path):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.path = path
+        self.lock = threading.Lock()
+
+    def record(self, **fields):
+        fields.setdefault("ts", time.time())
+        line = json.dumps(fields, ensure_ascii=False) + "\n"
+        with self.lock:
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write(line)
+
+
+def tracked_completion(client, telemetry, site, item=None, attempt=1, **kwargs):
+    """调用 client.chat.completions.create 并记录遥测（telemetry 为 None 时直接调用）"""
+    start = time.perf_counter()
+    try:
+        response = client.chat.completions.create(**kwargs)
+    except Exception as e:
+        if telemetry is not None:
+            telemetry.record(
+                site=site, model=kwargs.get("model"), item=item, attempt=attempt,
+                prompt_tokens=None, completion_tokens=None,
+                latency=round(time.perf_counter() - start, 3), error=type(e).__name__
+            )
+        raise
+    if telemetry is not None:
+        usage = getattr(response, "usage", None)
+        telemetry.record(
+            site=site, model=kwargs.get("model"), item=item, attempt=attempt,
+            prompt_tokens=getattr(usage, "prompt_tokens", None),
+            completion_tokens=getattr(usage, "completion_tokens", None),
+            latency=round(time.perf_counter() - start, 3), error=None
+        )
+    return response
+
+
+def tracked_stream_completion(client, telemetry, site, consume, item=None, attempt=1, **kwargs):
+    """
+    流式调用：consume(stream) 读取流并返回 (内容, usage, 是否提前停止)。
+    默认请求末尾 usage 块；耗时包含读取过程；提前停止时收不到 usage，token 数记为空。
+    """
+    kwargs.setdefault("stream_options", {"include_usage": True})
+    start = time.perf_counter()
+    try:
+        content, usage, stopped_early = consume(client.chat.completions.create(stream=True, **kwargs))
+    except Exception as e:
+        if telemetry is not None:
+            telemetry.record(
+                site=site, model=kwargs.get("model"), item=item, attempt=attempt,
+                prompt_tokens=None, completion_tokens=None,
+                latency=round(time.perf_counter() - start, 3), error=type(e).__name__, stream=True
+            )
+        raise
+    if telemetry is not None:
+        telemetry.record(
+            site=site, model=kwargs.get("model"), item=item, attempt=attempt,
+            prompt_tokens=getattr(usage, "prompt_tokens", None),
+            completion_tokens=getattr(usage, "completion_tokens", None),
+            latency=round(time.perf_counter() - start, 3), error=None,
+            stream=True, stopped_early=stopped_early
+        )
+    return content, usage
+
+
+def percentile(values, q):
+    """
+    最近秩法分位数：第 ceil(q/100 × n) 小的值
+
+    >>> percentile(range(1, 11), 50), percentile(range(1, 21), 95), percentile(range(1, 101), 7)
+    (5, 19, 7)
+    """
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(0, min(len(ordered) - 1, math.ceil(round(q / 100 * len(ordered), 9)) - 1))
+    return ordered[rank]
+
+
+def load_records(path):
+    records = []
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            try:
+                records.append(json.loads(line))
+            except ValueError:
+                continue
+    return records
+
+
+def summarize(records):
+    """按 (调用方, 模型) 汇总延迟分位数、token 与吞吐"""
+    groups = defaultdict(list)
+    for record in records:
+        groups[(record.get("site"), record.get("model"))].append(record)
+
+    summary = []
+    for (site, model), rows in sorted(groups.items(), key=lambda kv: (str(kv[0][0]), str(kv[0][1]))):
+        latencies = [r["latency"] for r in rows if r.get("error") is None]
+        tokens_per_item = defaultdict(int)
+        for r in rows:
+            tokens_per_item[r.get("item")] += (r.get("prompt_tokens") or 0) + (r.get("completion_tokens") or 0)
+        span = max(r["ts"] for r in rows) - min(r["ts"] - r.get("latency", 0) for r in rows)
+        summary.append({
+            "site": site,
+            "model": model,
+            "calls": len(rows),
+            "errors": sum(1 for r in rows if r.get("error")),
+            "retries": sum(1 for r in rows if (r.get("attempt") or 1) > 1),
+            "p50_latency": percentile(latencies, 50),
+            "p95_latency": percentile(latencies, 95),
+            "prompt_tokens": sum(r.get("prompt_tokens") or 0 for r in rows),
+            "completion_tokens": sum(r.get("completion_tokens") or 0 for r in rows),
+            "tokens_per_item": sum(tokens_per_item.values()) / len(tokens_per_item),
+            "items_per_min": len(tokens_per_item) / span * 60 if span > 0 else None,
+        })
+    return summary
+
+
+def print_summary(summary):
+    for s in summary:
+        def fmt(value, spec):
+            return format(value, spec) if value is not None else "-"
+        print(f"[{s['site']}] {s['model']}")
+        print(f"  调用 {s['calls']} 次 | 失败 {s['errors']} | 重试 {s['retries']}")
+        print(f"  延迟 p50 {fmt(s['p50_latency'], '.2f')}s | p95 {fmt(s['p95_latency'], '.2f')}s")
+        print(f"  token 提示 {s['prompt_tokens']} | 补全 {s['completion_tokens']} | 每条目 {s['tokens_per_item']:.0f}")
+        print(f"  吞吐 {fmt(s['items_per_min'], '.2f')} 条目/分钟")
+
+
+def main():
+    cli = argparse.ArgumentParser(description="LLM调用遥测工具")
+    commands = cli.add_subparsers(dest="command", required=True)
+    summary_cmd = commands.add_parser("summary", help="汇总延迟、token与吞吐")
+    summary_cmd.add_argument("path", help="遥测JSONL文件")
+    summary_cmd.add_argument("--site", help="仅统计指定调用方（reader/scorer/codegen）")
+    args = cli.parse_args()
+
+    records = load_records(args.path)
+    if args.site:
+        records = [r for r in records if r.get("site") == args.site]
+    if not records:
+        print("没有遥测记录")
+        return
+    print_summary(summarize(records))
+
+
+if __name__ == "__main__":
+    main()